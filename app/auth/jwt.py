@@ -1,29 +1,44 @@
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import jwt
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import Annotated, List
-from app.db import crud, schemas, models
-from app.db.database import get_db
-from app.dependencies import SECRET_KEY
+from typing import Annotated, List, Optional
+from app.auth.revocation import revocation_list
+from app.db import schemas, models
+from app.dependencies import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES, SECRET_KEY
 
 
 # to get a string like this run:
 # openssl rand -hex 32
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 30  # 30 days
+
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/auth/login")
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
 
 class TokenData(BaseModel):
     username: str | None = None
-    
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class TokenUser(BaseModel):
+    """The authenticated user, as described by the claims of its access token."""
+    id: int
+    email: str
+    is_admin: bool = False
+    is_active: bool = False
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -34,10 +49,40 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)  # Inject db dependency
-):
+def create_token_pair(user: models.User) -> Token:
+    """Issues an access token carrying the user's claims and a refresh token."""
+    # iat keeps sub-second precision so revocations compare exactly
+    issued_at = time.time()
+    access_token = create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "adm": bool(user.is_admin),
+            "act": bool(user.is_active),
+            "typ": ACCESS_TOKEN_TYPE,
+            "iat": issued_at,
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    refresh_token = create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "typ": REFRESH_TOKEN_TYPE,
+            "jti": uuid.uuid4().hex,
+            "iat": issued_at,
+        },
+        expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+    )
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
+
+def decode_token(token: str, token_type: str) -> dict:
+    """Validates signature, expiry, type and revocation; returns the claims."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -45,11 +90,6 @@ async def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(username=email)
-    
     except jwt.ExpiredSignatureError:  # Token sudah kedaluwarsa
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -59,10 +99,32 @@ async def get_current_user(
     except jwt.InvalidTokenError:  # Token tidak valid
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=token_data.username)  # Inject db
-    if user is None:
+    user_id = payload.get("uid")
+    if payload.get("sub") is None or user_id is None or payload.get("typ") != token_type:
         raise credentials_exception
-    return user
+    if revocation_list.is_revoked(user_id, payload.get("iat", 0), payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+def revoke_refresh_token(payload: dict) -> bool:
+    """Marks a refresh token used; returns False if it already was."""
+    return revocation_list.revoke_token(payload["jti"], payload["exp"])
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+):
+    # Authorization only needs the token claims, so no database lookup here
+    payload = decode_token(token, ACCESS_TOKEN_TYPE)
+    return TokenUser(
+        id=payload["uid"],
+        email=payload["sub"],
+        is_admin=payload.get("adm", False),
+        is_active=payload.get("act", False),
+    )
 
 async def get_current_active_user(
     current_user: Annotated[schemas.UserResponse, Depends(get_current_user)],
@@ -70,4 +132,3 @@ async def get_current_active_user(
     if current_user.is_active == False:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
-
@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Optional
+from app.dependencies import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES
+
+class TokenRevocationList:
+    """In-memory token revocation, checked in O(1) on every authenticated request.
+
+    Holds a cutoff timestamp per user (tokens issued before it are revoked)
+    and the ids of individual refresh tokens already used. Entries are dropped
+    once every token they could match has expired, so the list stays small.
+    State is per process: with several workers, each keeps its own list.
+    """
+
+    def __init__(self, retention_seconds: float):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._revoked_before: dict = {}
+        self._revoked_ids: dict = {}
+
+    def revoke_user(self, user_id: int):
+        now = time.time()
+        with self._lock:
+            self._revoked_before[user_id] = now
+            self._prune(now)
+
+    def revoke_token(self, token_id: str, expires_at: float) -> bool:
+        """Revokes one token; returns False if it was already revoked."""
+        with self._lock:
+            if token_id in self._revoked_ids:
+                return False
+            self._revoked_ids[token_id] = expires_at
+            self._prune(time.time())
+            return True
+
+    def is_revoked(self, user_id: int, issued_at: float, token_id: Optional[str] = None) -> bool:
+        revoked_before = self._revoked_before.get(user_id)
+        if revoked_before is not None and issued_at < revoked_before:
+            return True
+        return token_id is not None and token_id in self._revoked_ids
+
+    def __len__(self):
+        return len(self._revoked_before) + len(self._revoked_ids)
+
+    def _prune(self, now: float):
+        horizon = now - self.retention_seconds
+        for user_id in [user_id for user_id, at in self._revoked_before.items() if at < horizon]:
+            del self._revoked_before[user_id]
+        for token_id in [token_id for token_id, expires_at in self._revoked_ids.items() if expires_at < now]:
+            del self._revoked_ids[token_id]
+
+# A user revocation must outlive every token issued before it
+revocation_list = TokenRevocationList(retention_seconds=60 * max(ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES))
+
+def revoke_user_tokens(user_id: int):
+    """Revokes every access and refresh token issued to the user so far."""
+    revocation_list.revoke_user(user_id)
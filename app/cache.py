@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+from app.dependencies import PLACE_CACHE_ENABLED, PLACE_CACHE_MAXSIZE, PLACE_CACHE_TTL, READ_REPLICA_MAX_LAG_SECONDS
+
+_MISSING = object()
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Entries can be tagged; invalidating a tag drops every entry carrying it.
+    Each tag also has a generation number, so a value loaded while one of its
+    tags was being invalidated is never stored.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: dict = {}
+        self._generations: dict = {}
+        self._invalidated_at: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, tags = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()):
+        if not self.enabled:
+            return
+        tags = tuple(tags)
+        with self._lock:
+            self._store(key, value, tags)
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Returns the cached value for `key`, calling `loader` on a miss. None results are not cached."""
+        if not self.enabled:
+            return loader()
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        tags = tuple(tags)
+        with self._lock:
+            generations = [self._generations.get(tag, 0) for tag in tags]
+        value = loader()
+        if value is None:
+            return value
+        with self._lock:
+            if generations == [self._generations.get(tag, 0) for tag in tags]:
+                self._store(key, value, tags)
+        return value
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            now = time.monotonic()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                self._invalidated_at[tag] = now
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def invalidated_within(self, tags: Iterable[str], seconds: float) -> bool:
+        """Whether any of the tags was invalidated in the last `seconds`."""
+        with self._lock:
+            since = time.monotonic() - seconds
+            return any(self._invalidated_at.get(tag, float("-inf")) > since for tag in tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _store(self, key: Hashable, value: Any, tags: tuple):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+# ------------------ Place Cache ------------------
+
+# Cached place lists carry PLACE_LIST_TAG, since any place write can change
+# list membership or order. Cached place details carry PLACE_DETAIL_TAG and
+# place_tag(id).
+PLACE_LIST_TAG = "places:list"
+PLACE_DETAIL_TAG = "places:detail"
+# The cached coordinates of all places only change when places are added,
+# removed or moved; ratings leave them alone
+PLACE_COORDINATES_TAG = "places:coordinates"
+
+def place_tag(place_id: int) -> str:
+    return f"place:{place_id}"
+
+place_cache = TTLCache(maxsize=PLACE_CACHE_MAXSIZE, ttl=PLACE_CACHE_TTL, enabled=PLACE_CACHE_ENABLED)
+
+def invalidate_place(place_id: int):
+    """Drops cached place lists and the cached detail of one place."""
+    place_cache.invalidate(PLACE_LIST_TAG, place_tag(place_id))
+
+def invalidate_place_lists():
+    place_cache.invalidate(PLACE_LIST_TAG)
+
+def invalidate_all_places():
+    place_cache.invalidate(PLACE_LIST_TAG, PLACE_DETAIL_TAG)
+
+def invalidate_place_coordinates():
+    place_cache.invalidate(PLACE_COORDINATES_TAG)
+
+def get_or_load_place(db, key: Hashable, loader: Callable[[], Any], tags: Iterable[str]) -> Any:
+    """place_cache.get_or_set for a loader reading through `db`.
+
+    A write invalidates the cache on the primary, but the replica may not
+    have it yet; a refill from the replica would then keep the stale value
+    for the whole TTL. For READ_REPLICA_MAX_LAG_SECONDS after an
+    invalidation of one of the tags the loader reads from the primary.
+    """
+    tags = tuple(tags)
+    if place_cache.invalidated_within(tags, READ_REPLICA_MAX_LAG_SECONDS):
+        # Only replica-routing sessions have it; others already use the primary
+        use_primary = getattr(db, "use_primary", None)
+        if use_primary is not None:
+            use_primary()
+    return place_cache.get_or_set(key, loader, tags=tags)
@@ -0,0 +1,87 @@
+import argparse
+
+from app.db import crud, migrations
+from app.db.importer import IMPORT_BATCH_SIZE, import_places
+from app.db.database import SessionLocal, engine, optimize
+from app.media import shutdown_media_workers, sweep_unused_photos
+
+def rebuild_ratings(args):
+    db = SessionLocal()
+    try:
+        count = crud.rebuild_rating_aggregates(db, place_id=args.place_id)
+    finally:
+        db.close()
+    print(f"Rebuilt rating aggregates for {count} rated place(s).")
+
+def rehash_photos(args):
+    db = SessionLocal()
+    try:
+        count = crud.rehash_legacy_photos(db)
+    finally:
+        db.close()
+    # Wait for the resized variants of the moved photos
+    shutdown_media_workers()
+    print(f"Moved {count} photo(s) to content-hash names.")
+
+def sweep_photos(args):
+    db = SessionLocal()
+    try:
+        count = sweep_unused_photos(lambda photo_url: crud.is_photo_in_use(db, photo_url))
+    finally:
+        db.close()
+    print(f"Deleted {count} unreferenced photo(s).")
+
+def import_survey(args):
+    db = SessionLocal()
+    try:
+        counts = import_places(db, args.csv_path, photo_dir=args.photos, batch_size=args.batch_size)
+    finally:
+        db.close()
+    shutdown_media_workers()
+    print(
+        f"Imported {args.csv_path}: {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['skipped']} skipped, {counts['photos']} photo(s) attached."
+    )
+
+def analyze(args):
+    optimize(engine, analysis_limit=args.analysis_limit)
+    print("Refreshed query planner statistics.")
+
+def migrate(args):
+    # Applied by main() before every command
+    print(f"Database schema is at version {args.schema_version}.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Pulo Aceh API maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrator = subparsers.add_parser("migrate", help="Create missing tables and apply pending schema migrations")
+    migrator.set_defaults(func=migrate)
+
+    rebuild = subparsers.add_parser("rebuild-ratings", help="Recompute place rating aggregates from the ratings table")
+    rebuild.add_argument("--place-id", type=int, default=None, help="Only rebuild this place")
+    rebuild.set_defaults(func=rebuild_ratings)
+
+    rehash = subparsers.add_parser("rehash-photos", help="Rename legacy photos to content-hash names and build their variants")
+    rehash.set_defaults(func=rehash_photos)
+
+    sweeper = subparsers.add_parser("sweep-photos", help="Delete stored photos that no user or place references")
+    sweeper.set_defaults(func=sweep_photos)
+
+    importer = subparsers.add_parser("import-places", help="Upsert places from a semicolon-separated survey CSV")
+    importer.add_argument("csv_path", help="e.g. pulo_aceh_wisata.csv")
+    importer.add_argument("--photos", default=None, help="Directory with <Foto>.jpg photos, e.g. drive-download-photos")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows per transaction")
+    importer.set_defaults(func=import_survey)
+
+    analyzer = subparsers.add_parser("analyze", help="Refresh the query planner statistics (ANALYZE)")
+    analyzer.add_argument("--analysis-limit", type=int, default=0, help="Rows sampled per index; 0 reads every row")
+    analyzer.set_defaults(func=analyze)
+
+    args = parser.parse_args(argv)
+
+    args.schema_version = migrations.upgrade(engine)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
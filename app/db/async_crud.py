@@ -0,0 +1,53 @@
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.media import delete_unused_photo, store_photo
+from .models import Place, User
+from .utils import verify_and_update_password_async
+
+# Async variants of the crud functions used by async endpoints. They run on
+# AsyncSession so database round trips never block the event loop.
+
+# ------------------ CRUD User ------------------
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    return await db.scalar(select(User).where(User.id == user_id))
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
+    if not user:
+        return False
+    is_valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not is_valid:
+        return False
+    if new_hash:
+        # Stored hash uses an outdated bcrypt cost
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+async def is_photo_in_use(db: AsyncSession, photo_url: str) -> bool:
+    # Photos are deduplicated by content, so several rows can share one file
+    if await db.scalar(select(User.id).where(User.photo_url == photo_url).limit(1)) is not None:
+        return True
+    return await db.scalar(select(Place.id).where(Place.image_url == photo_url).limit(1)) is not None
+
+async def update_user_photo(db: AsyncSession, user_id: int, photo: UploadFile):
+    db_user = await get_user_by_id(db, user_id)
+    if db_user:
+        # Stream the photo to disk and get the URL
+        new_photo_url = await run_in_threadpool(store_photo, photo.file)
+        old_photo_url = db_user.photo_url
+
+        # Update the user's photo URL
+        db_user.photo_url = new_photo_url
+        await db.commit()
+
+        # Delete the old photo if nothing else uses it
+        if old_photo_url and old_photo_url != new_photo_url and not await is_photo_in_use(db, old_photo_url):
+            await run_in_threadpool(delete_unused_photo, old_photo_url)
+    return db_user
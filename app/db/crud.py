@@ -1,12 +1,27 @@
-from fastapi import UploadFile
-from sqlalchemy.orm import Session
+from fastapi import HTTPException, UploadFile
+from app.auth.revocation import revoke_user_tokens
+from app.cache import (
+    PLACE_COORDINATES_TAG,
+    get_or_load_place,
+    invalidate_all_places,
+    invalidate_place,
+    invalidate_place_coordinates,
+    invalidate_place_lists,
+)
+from app.media import delete_photo, delete_unused_photo, is_content_addressed, store_photo
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload
 from .models import OTPVerification, Rating, User, Place, user_place_association
-from .schemas import RatingCreate, UserCreate, PlaceCreate, UserUpdate, PlaceUpdate, UserUpdateProfile
-from .utils import hash_password, verify_password
-from typing import List, Optional
-import uuid
-from pathlib import Path
+from .schemas import RatingCreate, UserCreate, PlaceBulkUpdate, PlaceCreate, UserUpdate, PlaceUpdate, UserUpdateProfile
+from .pagination import decode_cursor, encode_cursor, paginate
+from .ratings import STARS, has_message, has_message_expression, rating_stars, rating_stars_expression, star_column
+from .search import build_match_query, match, places_fts, rank_expression, snippet_expression
+from .spatial import NEARBY_INITIAL_RADIUS_KM, RANKING_FORMULA, Coordinates, bounding_boxes, haversine_km, nearest, places_rtree
+from .utils import hash_password, verify_and_update_password
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
+from pathlib import Path
 
 # ------------------ CRUD User ------------------
 
@@ -16,8 +31,13 @@ def get_user_by_id(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(User).offset(skip).limit(limit).all()
+def get_user_with_saved_places(db: Session, user_id: int):
+    return db.query(User).options(selectinload(User.saved_places)).filter(User.id == user_id).first()
+
+def get_users(db: Session, cursor: Optional[str] = None, limit: int = 10):
+    # Saved places of the whole page come from one extra IN query
+    query = db.query(User).options(selectinload(User.saved_places))
+    return paginate(query, [User.id], key=lambda user: [user.id], order="id", cursor=cursor, limit=limit)
 
 def create_user(db: Session, user: UserCreate):
     hashed_pw = hash_password(user.password)
@@ -36,8 +56,13 @@ def authenticate_user(db: Session, email: str, password: str):
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    is_valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not is_valid:
         return False
+    if new_hash:
+        # Stored hash uses an outdated bcrypt cost
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 def update_user(db: Session, user_id: int, user: UserUpdateProfile):
@@ -49,48 +74,57 @@ def update_user(db: Session, user_id: int, user: UserUpdateProfile):
         db_user.is_active = user.is_active if user.is_active is not None else db_user.is_active
         db.commit()
         db.refresh(db_user)
+        # Outstanding tokens carry the old claims
+        revoke_user_tokens(user_id)
     return db_user
 
-def store_photo(photo: bytes) -> str:
-    # Generate a unique filename
-    filename = f"{uuid.uuid4()}.jpg"
-    # Define the path where the photo will be stored in the static directory
-    photo_path = Path("static/photos") / filename
-
-    # Ensure the directory exists
-    photo_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Write the photo to the file
-    with open(photo_path, "wb") as f:
-        f.write(photo)
+def is_photo_in_use(db: Session, photo_url: str) -> bool:
+    # Photos are deduplicated by content, so several rows can share one file
+    return (
+        db.query(User.id).filter(User.photo_url == photo_url).first() is not None
+        or db.query(Place.id).filter(Place.image_url == photo_url).first() is not None
+    )
 
-    # Return the URL or path to the stored photo
-    return str(photo_path)
+def rehash_legacy_photos(db: Session) -> int:
+    """Moves photos stored under random names to content-hash names; returns how many moved."""
+    renamed = {}
+    for row, attribute in [(user, "photo_url") for user in db.query(User).filter(User.photo_url.isnot(None))] + \
+            [(place, "image_url") for place in db.query(Place).filter(Place.image_url.isnot(None))]:
+        photo_url = getattr(row, attribute)
+        photo_path = Path(photo_url)
+        if photo_url not in renamed:
+            if is_content_addressed(photo_path) or not photo_path.is_file():
+                continue
+            try:
+                with open(photo_path, "rb") as photo:
+                    renamed[photo_url] = store_photo(photo)
+            except HTTPException:
+                # Not an image we can serve; leave it alone
+                continue
+        setattr(row, attribute, renamed[photo_url])
+    db.commit()
 
-def delete_photo(photo_url: str) -> bool:
-    photo_path = Path(photo_url)
-    if photo_path.exists():
-        photo_path.unlink()
-        return True
-    return False
+    for photo_url, new_photo_url in renamed.items():
+        if photo_url != new_photo_url:
+            delete_photo(photo_url)
+    invalidate_all_places()
+    return len(renamed)
 
 def update_user_photo(db: Session, user_id: int, photo: UploadFile):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
-        # Read the photo file
-        photo_bytes = photo.file.read()
-        
-        # Store the new photo and get the URL
-        new_photo_url = store_photo(photo_bytes)
-        
-        # Delete the old photo if it exists
-        if db_user.photo_url:
-            delete_photo(db_user.photo_url)
-        
+        # Stream the photo to disk and get the URL
+        new_photo_url = store_photo(photo.file)
+        old_photo_url = db_user.photo_url
+
         # Update the user's photo URL
         db_user.photo_url = new_photo_url
         db.commit()
         db.refresh(db_user)
+
+        # Delete the old photo if nothing else uses it
+        if old_photo_url and old_photo_url != new_photo_url and not is_photo_in_use(db, old_photo_url):
+            delete_unused_photo(old_photo_url)
     return db_user
 
 def delete_user(db: Session, user_id: int):
@@ -98,35 +132,71 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        revoke_user_tokens(user_id)
     return db_user
 
 def save_place_to_user(db: Session, user_id: int, place_id: int):
-    user = db.query(User).filter(User.id == user_id).first()
-    place = db.query(Place).filter(Place.id == place_id).first()
-    if user and place:
-        # Check if the place is already saved by the user
-        if place in user.saved_places:
-            return {"message": "Place already saved to user's list."}
-        
-        # If not saved, append the place and commit the transaction
-        user.saved_places.append(place)
-        db.commit()
-        return user
-    return {"message": "User or place not found."}
+    # One indexed insert on the (user_id, place_id) primary key; the SELECT
+    # makes it a no-op for unknown places
+    saved = db.execute(
+        sqlite_insert(user_place_association)
+        .from_select(["user_id", "place_id"], select(literal(user_id), Place.id).where(Place.id == place_id))
+        .on_conflict_do_nothing()
+    ).rowcount
+    db.commit()
+    if saved:
+        return True
+    if get_place_by_id(db, place_id) is None:
+        return {"message": "User or place not found."}
+    return {"message": "Place already saved to user's list."}
 
 def unsave_place_from_user(db: Session, user_id: int, place_id: int):
-    user = db.query(User).filter(User.id == user_id).first()
-    place = db.query(Place).filter(Place.id == place_id).first()
-    if user and place:
-        # Check if the place is saved by the user
-        if place not in user.saved_places:
-            return {"message": "Place not found in user's saved list."}
-        
-        # If saved, remove the place and commit the transaction
-        user.saved_places.remove(place)
-        db.commit()
-        return user
-    return {"message": "User or place not found."}
+    removed = db.execute(
+        delete(user_place_association).where(
+            user_place_association.c.user_id == user_id,
+            user_place_association.c.place_id == place_id,
+        )
+    ).rowcount
+    db.commit()
+    if removed:
+        return True
+    if get_place_by_id(db, place_id) is None:
+        return {"message": "User or place not found."}
+    return {"message": "Place not found in user's saved list."}
+
+def save_places_to_user(db: Session, user_id: int, place_ids: List[int]):
+    """Saves every existing place; returns (ids newly saved, ids that exist)."""
+    existing_ids = get_existing_place_ids(db, place_ids)
+    already_saved = set(db.scalars(
+        select(user_place_association.c.place_id).where(
+            user_place_association.c.user_id == user_id,
+            user_place_association.c.place_id.in_(existing_ids),
+        )
+    ))
+    new_ids = existing_ids - already_saved
+    if new_ids:
+        db.execute(
+            sqlite_insert(user_place_association).on_conflict_do_nothing(),
+            [{"user_id": user_id, "place_id": place_id} for place_id in new_ids],
+        )
+    db.commit()
+    return new_ids, existing_ids
+
+def unsave_places_from_user(db: Session, user_id: int, place_ids: List[int]) -> set:
+    """Removes the given places from the saved list; returns the ids that were saved."""
+    removed = db.scalars(
+        delete(user_place_association)
+        .where(user_place_association.c.user_id == user_id, user_place_association.c.place_id.in_(set(place_ids)))
+        .returning(user_place_association.c.place_id)
+    ).all()
+    db.commit()
+    return set(removed)
+
+def get_saved_places(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 10):
+    query = db.query(Place).join(user_place_association, user_place_association.c.place_id == Place.id).filter(
+        user_place_association.c.user_id == user_id
+    )
+    return paginate(query, [Place.id], key=lambda place: [place.id], order="saved", cursor=cursor, limit=limit)
 
 # ------------------ CRUD OTP ------------------
 def create_otp(db: Session, email: str, otp: str, expires_in_minutes: int = 10):
@@ -163,13 +233,204 @@ def delete_otp_by_email(db: Session, email: str):
 def get_place_by_id(db: Session, place_id: int):
     return db.query(Place).filter(Place.id == place_id).first()
 
-def get_places(db: Session, skip: int = 0, limit: int = 10, search: Optional[str] = None, min_rating: Optional[float] = None):
-    query = db.query(Place)
-    if search:
-        query = query.filter(Place.name.ilike(f'%{search}%'))
+PLACE_ORDERINGS = ("id", "rating", "relevance", "distance")
+
+def get_places(
+    db: Session,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    search: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    order_by: Optional[str] = None,
+    near: Optional[Tuple[float, float]] = None,
+    distance_formula: str = "geodesic",
+):
+    """A page of places and the next cursor; with `near` = (lat, lon) every place gets its `distance`."""
+    if order_by == "distance":
+        if near is None:
+            raise HTTPException(status_code=400, detail="order_by=distance needs user_lat and user_lon")
+        return get_places_by_distance(
+            db, near[0], near[1], cursor=cursor, limit=limit, search=search, min_rating=min_rating, formula=distance_formula
+        )
+    places, next_cursor = _get_places(db, cursor, limit, search, min_rating, order_by)
+    if near is not None:
+        set_place_distances(places, near[0], near[1], distance_formula)
+    return places, next_cursor
+
+def _get_places(db: Session, cursor: Optional[str], limit: int, search: Optional[str], min_rating: Optional[float], order_by: Optional[str]):
+    match_query = build_match_query(search) if search else None
+    if order_by is None:
+        order_by = "relevance" if match_query else "id"
+
+    if match_query is None:
+        query = db.query(Place)
+        if order_by == "relevance":
+            order_by = "id"
+    else:
+        # Full-text search through the FTS5 index
+        query = (
+            db.query(Place, snippet_expression())
+            .join(places_fts, places_fts.c.rowid == Place.id)
+            .filter(match(match_query))
+        )
     if min_rating is not None:
         query = query.filter(Place.average_rating >= min_rating)
-    return query.offset(skip).limit(limit).all()
+
+    if order_by == "rating":
+        columns, descending = [Place.average_rating, Place.id], True
+    elif order_by == "relevance":
+        columns, descending = [rank_expression(), Place.id], False
+        query = query.add_columns(rank_expression())
+    else:
+        columns, descending = [Place.id], False
+
+    if match_query is None:
+        key = lambda place: [place.average_rating, place.id] if order_by == "rating" else [place.id]
+        return paginate(query, columns, key=key, order=order_by, cursor=cursor, limit=limit, descending=descending)
+
+    # Search rows are (place, snippet) or (place, snippet, rank) tuples
+    if order_by == "rating":
+        key = lambda row: [row[0].average_rating, row[0].id]
+    elif order_by == "relevance":
+        key = lambda row: [row[2], row[0].id]
+    else:
+        key = lambda row: [row[0].id]
+    rows, next_cursor = paginate(query, columns, key=key, order=order_by, cursor=cursor, limit=limit, descending=descending)
+    places = []
+    for place, snippet, *_ in rows:
+        place.snippet = snippet
+        places.append(place)
+    return places, next_cursor
+
+def _place_coordinates(db: Session, query):
+    """(ids, Coordinates) of the (id, latitude, longitude) rows of `query` that have a location."""
+    rows = db.execute(query.where(Place.latitude.is_not(None), Place.longitude.is_not(None)))
+    ids, latitudes, longitudes = [], [], []
+    for place_id, latitude, longitude in rows:
+        ids.append(place_id)
+        latitudes.append(float(latitude))
+        longitudes.append(float(longitude))
+    return ids, Coordinates(latitudes, longitudes)
+
+def get_place_coordinates(db: Session):
+    """(ids, Coordinates) of every place with a location, cached until places are added, removed or moved."""
+    def load():
+        return _place_coordinates(db, select(Place.id, Place.latitude, Place.longitude))
+
+    return get_or_load_place(db, ("coordinates",), load, tags=[PLACE_COORDINATES_TAG])
+
+def set_place_distances(places, lat: float, lon: float, formula: str = "geodesic"):
+    """Sets `distance` in kilometers on every place with a location, in one pass."""
+    located = [place for place in places if place.latitude is not None and place.longitude is not None]
+    coordinates = Coordinates([float(place.latitude) for place in located], [float(place.longitude) for place in located])
+    for place, distance in zip(located, coordinates.distances_km(lat, lon, formula)):
+        place.distance = float(distance)
+    return places
+
+def get_places_by_distance(
+    db: Session,
+    lat: float,
+    lon: float,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    search: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    formula: str = "geodesic",
+):
+    """Places ordered by distance from (lat, lon), nearest first, with `distance` set.
+
+    Without filters the cached coordinates of all places are ranked; with
+    `search` or `min_rating`, SQL picks the matching places first and only
+    those are ranked. Either way one ranking pass and one query for the
+    page's rows. Places without a location are left out.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    after = None
+    if cursor is not None:
+        key = decode_cursor(cursor, "distance")
+        if len(key) != 2 or not isinstance(key[0], (int, float)) or not isinstance(key[1], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (float(key[0]), key[1])
+
+    match_query = build_match_query(search) if search else None
+    if match_query is None and min_rating is None:
+        ids, coordinates = get_place_coordinates(db)
+    else:
+        query = select(Place.id, Place.latitude, Place.longitude)
+        if match_query is not None:
+            query = query.join(places_fts, places_fts.c.rowid == Place.id).where(match(match_query))
+        if min_rating is not None:
+            query = query.where(Place.average_rating >= min_rating)
+        ids, coordinates = _place_coordinates(db, query)
+
+    # Cheap formulas rank with the distances they return, so pages and
+    # cursors follow them; geodesic ranks by the closest cheap formula
+    ranking = RANKING_FORMULA if formula == "geodesic" else formula
+    ranked = nearest(coordinates.distances_km(lat, lon, ranking), ids, limit + 1, after=after)
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor("distance", list(ranked[-1]))
+    query = db.query(Place).filter(Place.id.in_([place_id for _, place_id in ranked]))
+    if match_query is not None:
+        # Snippets need the MATCH
+        query = query.add_columns(snippet_expression()).join(places_fts, places_fts.c.rowid == Place.id).filter(match(match_query))
+    found = {}
+    for row in query:
+        place = row if match_query is None else row[0]
+        if match_query is not None:
+            place.snippet = row[1]
+        found[place.id] = place
+    # Cached coordinates may still list a place deleted in the meantime
+    page = [(distance, found[place_id]) for distance, place_id in ranked if place_id in found]
+
+    places = [place for _, place in page]
+    if formula == ranking:
+        for distance, place in page:
+            place.distance = distance
+    else:
+        set_place_distances(places, lat, lon, formula)
+    return places, next_cursor
+
+def get_nearby_places(db: Session, lat: float, lon: float, radius_km: float = 10.0, limit: int = 10):
+    # Search rings of growing radius through the R*Tree until the ring holds
+    # `limit` places; anything outside the ring is farther than all of them.
+    search_km = min(radius_km, NEARBY_INITIAL_RADIUS_KM)
+    while True:
+        boxes = [
+            and_(
+                places_rtree.c.max_lat >= min_lat,
+                places_rtree.c.min_lat <= max_lat,
+                places_rtree.c.max_lon >= min_lon,
+                places_rtree.c.min_lon <= max_lon,
+            )
+            for min_lat, max_lat, min_lon, max_lon in bounding_boxes(lat, lon, search_km)
+        ]
+        candidates = db.execute(
+            select(Place.id, Place.latitude, Place.longitude)
+            .join(places_rtree, places_rtree.c.id == Place.id)
+            .where(or_(*boxes))
+        ).all()
+        hits = []
+        for place_id, place_lat, place_lon in candidates:
+            distance = haversine_km(lat, lon, float(place_lat), float(place_lon))
+            if distance <= search_km:
+                hits.append((distance, place_id))
+        if len(hits) >= limit or search_km >= radius_km:
+            break
+        search_km = min(search_km * 2, radius_km)
+
+    hits.sort()
+    hits = hits[:limit]
+    places = {place.id: place for place in db.query(Place).filter(Place.id.in_([place_id for _, place_id in hits]))}
+    nearby = []
+    for distance, place_id in hits:
+        place = places[place_id]
+        place.distance = distance
+        nearby.append(place)
+    return nearby
 
 def create_place(db: Session, place: PlaceCreate):
     db_place = Place(
@@ -183,6 +444,8 @@ def create_place(db: Session, place: PlaceCreate):
     db.add(db_place)
     db.commit()
     db.refresh(db_place)
+    invalidate_place_lists()
+    invalidate_place_coordinates()
     return db_place
 
 def update_place(db: Session, place_id: int, place: PlaceUpdate):
@@ -194,27 +457,30 @@ def update_place(db: Session, place_id: int, place: PlaceUpdate):
         db_place.latitude = place.latitude or db_place.latitude
         db_place.longitude = place.longitude or db_place.longitude
         db_place.image_url = place.image_url or db_place.image_url
+        moved = bool(place.latitude or place.longitude)
         db.commit()
         db.refresh(db_place)
+        invalidate_place(place_id)
+        if moved:
+            invalidate_place_coordinates()
     return db_place
 
 def update_place_image(db: Session, place_id: int, image: UploadFile):
     db_place = db.query(Place).filter(Place.id == place_id).first()
     if db_place:
-        # Read the image file
-        image_bytes = image.file.read()
-        
-        # Store the new image and get the URL
-        new_image_url = store_photo(image_bytes)
-        
-        # Delete the old image if it exists
-        if db_place.image_url:
-            delete_photo(db_place.image_url)
-        
+        # Stream the image to disk and get the URL
+        new_image_url = store_photo(image.file)
+        old_image_url = db_place.image_url
+
         # Update the place's image URL
         db_place.image_url = new_image_url
         db.commit()
         db.refresh(db_place)
+        invalidate_place(place_id)
+
+        # Delete the old image if nothing else uses it
+        if old_image_url and old_image_url != new_image_url and not is_photo_in_use(db, old_image_url):
+            delete_unused_photo(old_image_url)
     return db_place
 
 def delete_place(db: Session, place_id: int):
@@ -222,33 +488,160 @@ def delete_place(db: Session, place_id: int):
     if db_place:
         db.delete(db_place)
         db.commit()
+        invalidate_place(place_id)
+        invalidate_place_coordinates()
     return db_place
 
+# ------------------ Bulk Place Writes ------------------
+
+def get_existing_place_ids(db: Session, place_ids: List[int]) -> set:
+    return set(db.scalars(select(Place.id).where(Place.id.in_(set(place_ids)))))
+
+def bulk_create_places(db: Session, places: List[PlaceCreate]) -> List[int]:
+    """Inserts all places in one transaction; returns their ids, read back with RETURNING, in payload order."""
+    if not places:
+        return []
+    # SQLAlchemy sends multi-row INSERTs where the backend can return ids in
+    # payload order, and one INSERT per row otherwise, as on SQLite (about
+    # 15% slower there than a plain executemany). Deriving the ids from
+    # max(id) instead would race with writers in other processes.
+    place_ids = list(db.scalars(
+        insert(Place.__table__).returning(Place.__table__.c.id, sort_by_parameter_order=True),
+        [place.model_dump() for place in places],
+    ))
+    db.commit()
+    invalidate_place_lists()
+    invalidate_place_coordinates()
+    return place_ids
+
+def bulk_update_places(db: Session, places: List[PlaceBulkUpdate]) -> set:
+    """Applies the given fields of every existing place in one transaction; returns the ids that exist."""
+    existing_ids = get_existing_place_ids(db, [place.id for place in places])
+    rows = [
+        place.model_dump(exclude_none=True)
+        for place in places
+        if place.id in existing_ids and place.model_dump(exclude_none=True, exclude={"id"})
+    ]
+    if rows:
+        # ORM bulk UPDATE by primary key: one executemany per set of columns
+        db.execute(update(Place), rows)
+        db.commit()
+        invalidate_all_places()
+        if any("latitude" in row or "longitude" in row for row in rows):
+            invalidate_place_coordinates()
+    return existing_ids
+
+def bulk_delete_places(db: Session, place_ids: List[int]) -> set:
+    """Deletes all existing places in one transaction; returns the ids that existed."""
+    existing_ids = get_existing_place_ids(db, place_ids)
+    if existing_ids:
+        # Same cleanup the ORM does for a single delete: drop saved-place
+        # links and detach the place's ratings
+        db.execute(delete(user_place_association).where(user_place_association.c.place_id.in_(existing_ids)))
+        db.execute(update(Rating).where(Rating.place_id.in_(existing_ids)).values(place_id=None))
+        db.execute(delete(Place).where(Place.id.in_(existing_ids)))
+        db.commit()
+        invalidate_all_places()
+        invalidate_place_coordinates()
+    return existing_ids
+
 def create_rating(db: Session, user_id: int, place_id: int, rating: RatingCreate):
     db_rating = Rating(user_id=user_id, place_id=place_id, rating=rating.rating, message=rating.message)
     db.add(db_rating)
+
+    # Fold the new rating into the place aggregates and histogram in the
+    # same transaction
+    stars_column = getattr(Place, star_column(rating_stars(rating.rating)))
+    db.execute(
+        update(Place)
+        .where(Place.id == place_id)
+        .values(
+            {
+                Place.rating_count: Place.rating_count + 1,
+                Place.rating_sum: Place.rating_sum + rating.rating,
+                Place.average_rating: (Place.rating_sum + rating.rating) / (Place.rating_count + 1),
+                stars_column: stars_column + 1,
+                Place.message_count: Place.message_count + int(has_message(rating.message)),
+            }
+        )
+    )
     db.commit()
     db.refresh(db_rating)
-    
-    # Update average rating for the place
-    update_average_rating(db, place_id)
-    
+    invalidate_place(place_id)
+
     return db_rating
 
-def update_average_rating(db: Session, place_id: int):
-    ratings = db.query(Rating).filter(Rating.place_id == place_id).all()
-    if ratings:
-        average_rating = sum(r.rating for r in ratings) / len(ratings)
-        db_place = db.query(Place).filter(Place.id == place_id).first()
-        db_place.average_rating = average_rating
-        db.commit()
-        db.refresh(db_place)
+def rebuild_rating_aggregates(db: Session, place_id: Optional[int] = None) -> int:
+    """Recomputes the rating aggregates and histogram of places from the ratings table.
+
+    Runs as set-based UPDATEs in one transaction; returns the number of places with ratings.
+    """
+    stars = rating_stars_expression(Rating.rating)
+    totals = select(
+        Rating.place_id,
+        func.count(Rating.id).label("rating_count"),
+        func.sum(Rating.rating).label("rating_sum"),
+        func.sum(has_message_expression(Rating.message)).label("message_count"),
+        *[func.sum(case((stars == bucket, 1), else_=0)).label(star_column(bucket)) for bucket in STARS],
+    ).group_by(Rating.place_id)
+    reset = update(Place).values(
+        rating_count=0, rating_sum=0.0, average_rating=0.0, message_count=0,
+        **{star_column(bucket): 0 for bucket in STARS},
+    )
+    if place_id is not None:
+        totals = totals.where(Rating.place_id == place_id)
+        reset = reset.where(Place.id == place_id)
+    totals = totals.subquery()
+
+    db.execute(reset)
+    result = db.execute(
+        update(Place)
+        .where(Place.id == totals.c.place_id)
+        .values(
+            rating_count=totals.c.rating_count,
+            rating_sum=totals.c.rating_sum,
+            average_rating=totals.c.rating_sum / totals.c.rating_count,
+            message_count=totals.c.message_count,
+            **{star_column(bucket): totals.c[star_column(bucket)] for bucket in STARS},
+        )
+    )
+    db.commit()
+    if place_id is None:
+        invalidate_all_places()
+    else:
+        invalidate_place(place_id)
+    return result.rowcount
 
 def get_rating_by_id(db: Session, rating_id: int):
     return db.query(Rating).filter(Rating.id == rating_id).first()
 
-def get_ratings_by_place(db: Session, place_id: int):
-    return db.query(Rating).filter(Rating.place_id == place_id).all()
+def _newest_ratings(query, cursor: Optional[str], limit: int):
+    # Served by the (place_id, created_at) and (user_id, created_at) indexes;
+    # id breaks ties between ratings created in the same second
+    return paginate(
+        query,
+        [Rating.created_at, Rating.id],
+        key=lambda rating: [rating.created_at, rating.id],
+        order="newest",
+        cursor=cursor,
+        limit=limit,
+        descending=True,
+    )
+
+def get_ratings_by_place(db: Session, place_id: int, cursor: Optional[str] = None, limit: int = 20):
+    return _newest_ratings(db.query(Rating).filter(Rating.place_id == place_id), cursor, limit)
+
+def get_ratings_by_user(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 20):
+    return _newest_ratings(db.query(Rating).filter(Rating.user_id == user_id), cursor, limit)
 
-def get_ratings_by_user(db: Session, user_id: int):
-    return db.query(Rating).filter(Rating.user_id == user_id).all()
+def get_rating_summary(db: Session, place_id: int):
+    """Returns the stored rating aggregates and histogram of a place, or None if it does not exist."""
+    return db.execute(
+        select(
+            Place.id,
+            Place.rating_count,
+            Place.average_rating,
+            Place.message_count,
+            *[getattr(Place, star_column(bucket)) for bucket in STARS],
+        ).where(Place.id == place_id)
+    ).first()
@@ -0,0 +1,236 @@
+import csv
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import exists, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.cache import invalidate_all_places, invalidate_place_coordinates
+from app.media import delete_unused_photo, store_photo
+from .crud import is_photo_in_use
+from .migrations import PLACES_FTS_TRIGGERS
+from .models import Place
+from .search import places_fts
+
+logger = logging.getLogger(__name__)
+
+# Survey columns joined, in this order, into the place description
+DESCRIPTION_COLUMNS = (
+    ("Sejarah", "Sejarah"),
+    ("Keunikan Objek", "Keunikan Objek"),
+    ("Jalur Akses", "Jalur Akses"),
+    ("Fasilitas", "Fasilitas"),
+    ("Transportasi", "Transportasi"),
+    ("kondisi wisata", "Kondisi Wisata"),
+)
+
+IMPORT_BATCH_SIZE = 1000
+SUSPENDED_FTS_TRIGGERS = ("places_fts_ai", "places_fts_au")
+
+places = Place.__table__
+
+class InvalidRow(ValueError):
+    pass
+
+def parse_decimal(value: Optional[str]) -> Optional[float]:
+    """Parses survey numbers written with a decimal comma, e.g. '95,0660833'."""
+    value = (value or "").strip().replace(" ", "")
+    if not value:
+        return None
+    return float(value.replace(",", "."))
+
+def build_description(row: Dict[str, str]) -> str:
+    parts = [f"{label}: {row[column].strip()}" for column, label in DESCRIPTION_COLUMNS if (row.get(column) or "").strip()]
+    return "\n\n".join(parts) if parts else "No description available"
+
+def normalize_row(row: Dict[str, str]) -> dict:
+    """Turns one survey row into column values for the places table."""
+    try:
+        survey_no = int(row["No."])
+        longitude = parse_decimal(row["X"])
+        latitude = parse_decimal(row["Y"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidRow(f"unreadable number: {e}")
+    name = (row.get("Nama Potensi Wisata") or "").strip()
+    if not name:
+        raise InvalidRow("missing name")
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise InvalidRow("missing or out-of-range coordinates")
+
+    photo = (row.get("Foto") or "").strip()
+    return {
+        "code": (row.get("Kode") or "").strip(),
+        "survey_no": survey_no,
+        "name": name,
+        "description": build_description(row),
+        "location_name": (row.get("Nama Gampong") or "").strip() or "Unknown location",
+        "latitude": round(latitude, 7),
+        "longitude": round(longitude, 7),
+        "photo": photo or None,
+    }
+
+def read_survey_csv(path) -> Iterator[tuple]:
+    """Streams (line number, row) pairs from a semicolon-separated survey export."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter=";")
+        # Headers carry stray whitespace, e.g. "Kode "
+        header = [column.strip() for column in next(reader, [])]
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, row))
+
+# ------------------ Import ------------------
+
+class PlaceImporter:
+    """Upserts survey rows into places, keyed by (Kode, No.), in batched transactions.
+
+    The survey's Kode alone is not unique (it is blank or repeated for
+    several sites), so the row number completes the key. Places created
+    before the importer existed, which have no key yet, are matched by name
+    and coordinates and adopted instead of duplicated. Photos named
+    `<Foto>.jpg` in `photo_dir` are stored once each and attached.
+    """
+
+    def __init__(self, db: Session, photo_dir=None, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.photo_dir = Path(photo_dir) if photo_dir else None
+        self.batch_size = batch_size
+        self.counts = {"inserted": 0, "updated": 0, "skipped": 0, "photos": 0}
+        self._photo_urls: Dict[str, Optional[str]] = {}
+        # Only look for places to adopt when some have no survey key
+        self._has_legacy_places = db.scalar(select(exists().where(Place.code.is_(None))))
+
+    def run(self, csv_path) -> dict:
+        batch = []
+        for line_num, row in read_survey_csv(csv_path):
+            try:
+                batch.append(normalize_row(row))
+            except InvalidRow as e:
+                self.counts["skipped"] += 1
+                logger.warning("Skipping line %d of %s: %s", line_num, csv_path, e)
+                continue
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        invalidate_all_places()
+        invalidate_place_coordinates()
+        return self.counts
+
+    def _photo_url(self, photo: Optional[str]) -> Optional[str]:
+        if photo is None or self.photo_dir is None:
+            return None
+        if photo not in self._photo_urls:
+            photo_path = self.photo_dir / f"{photo}.jpg"
+            photo_url = None
+            if photo_path.is_file():
+                try:
+                    with open(photo_path, "rb") as f:
+                        photo_url = store_photo(f)
+                except HTTPException as e:
+                    logger.warning("Cannot store %s: %s", photo_path, e.detail)
+            else:
+                logger.warning("Photo %s not found", photo_path)
+            self._photo_urls[photo] = photo_url
+        return self._photo_urls[photo]
+
+    def _import_batch(self, rows: List[dict]):
+        for row in rows:
+            row["image_url"] = self._photo_url(row.pop("photo"))
+
+        conn = self.db.connection()
+        # pysqlite only opens a transaction before DML, so the trigger DDL
+        # below would commit on its own. Open it here: dropping and
+        # restoring the triggers then commits or rolls back with the batch,
+        # and writers on other connections never see them missing.
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        keys = {(row["code"], row["survey_no"]) for row in rows}
+        # Row-value IN lists are not served by the (code, survey_no) index,
+        # so probe it with one IN list per column and filter the pairs here
+        candidates = self.db.execute(
+            select(places.c.id, places.c.code, places.c.survey_no, places.c.image_url).where(
+                places.c.code.in_({code for code, _ in keys}),
+                places.c.survey_no.in_({survey_no for _, survey_no in keys}),
+            )
+        )
+        existing = {
+            (code, survey_no): (place_id, image_url)
+            for place_id, code, survey_no, image_url in candidates
+            if (code, survey_no) in keys
+        }
+        missing = [row for row in rows if (row["code"], row["survey_no"]) not in existing]
+        if missing and self._has_legacy_places:
+            self._adopt_legacy_places(missing, existing)
+
+        # Index the batch with two set-based statements instead of one
+        # trigger call per row; the triggers are back before the commit
+        for name in SUSPENDED_FTS_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(places_fts.insert().from_select(
+            ["places_fts", "rowid", "name", "description", "location_name"],
+            select(literal("delete"), places.c.id, places.c.name, places.c.description, places.c.location_name)
+            .where(places.c.id.in_([place_id for place_id, _ in existing.values()])),
+        ))
+
+        statement = insert(places)
+        statement = statement.on_conflict_do_update(
+            index_elements=["code", "survey_no"],
+            set_={
+                "name": statement.excluded.name,
+                "description": statement.excluded.description,
+                "location_name": statement.excluded.location_name,
+                "latitude": statement.excluded.latitude,
+                "longitude": statement.excluded.longitude,
+                # Keep the current photo of rows whose photo is missing
+                "image_url": func.coalesce(statement.excluded.image_url, places.c.image_url),
+            },
+        ).returning(places.c.id)
+        # Core insert on the table: multi-row VALUES statements, no ORM bulk grouping
+        place_ids = conn.execute(statement, rows).scalars().all()
+        conn.execute(places_fts.insert().from_select(
+            ["rowid", "name", "description", "location_name"],
+            select(places.c.id, places.c.name, places.c.description, places.c.location_name).where(places.c.id.in_(place_ids)),
+        ))
+        for name in SUSPENDED_FTS_TRIGGERS:
+            conn.exec_driver_sql(PLACES_FTS_TRIGGERS[name])
+        self.db.commit()
+
+        replaced = set()
+        for row in rows:
+            key = (row["code"], row["survey_no"])
+            _, old_image_url = existing.get(key, (None, None))
+            if key in existing:
+                self.counts["updated"] += 1
+                if row["image_url"] and old_image_url and old_image_url != row["image_url"]:
+                    replaced.add(old_image_url)
+            else:
+                self.counts["inserted"] += 1
+            if row["image_url"] and old_image_url != row["image_url"]:
+                self.counts["photos"] += 1
+        for photo_url in replaced:
+            if not is_photo_in_use(self.db, photo_url):
+                delete_unused_photo(photo_url)
+
+    def _adopt_legacy_places(self, rows: List[dict], existing: dict):
+        # Numeric columns come back rounded to their scale of 6 digits
+        by_location = {(row["name"], round(row["latitude"], 6), round(row["longitude"], 6)): row for row in rows}
+        legacy = self.db.execute(
+            select(Place.id, func.trim(Place.name), Place.latitude, Place.longitude, Place.image_url).where(
+                Place.code.is_(None), func.trim(Place.name).in_([row["name"] for row in rows])
+            )
+        )
+        for place_id, name, latitude, longitude, image_url in legacy:
+            row = by_location.pop((name, round(float(latitude), 6), round(float(longitude), 6)), None)
+            if row is not None:
+                self.db.execute(update(Place).where(Place.id == place_id).values(code=row["code"], survey_no=row["survey_no"]))
+                existing[(row["code"], row["survey_no"])] = (place_id, image_url)
+
+def import_places(db: Session, csv_path, photo_dir=None, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Imports a survey CSV; returns counts of inserted, updated and skipped rows and attached photos."""
+    return PlaceImporter(db, photo_dir=photo_dir, batch_size=batch_size).run(csv_path)
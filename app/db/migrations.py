@@ -0,0 +1,176 @@
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+# Schema changes applied on top of the tables created by models.Base.metadata.
+# Each migration runs once, in order; the number of applied migrations is
+# tracked in SQLite's PRAGMA user_version. create_all only creates missing
+# tables, so new columns and indexes of existing tables need a migration.
+MIGRATIONS = []
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+def _execute_all(conn: Connection, statements):
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+def _add_column(conn: Connection, table_name: str, column_name: str, ddl: str):
+    columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table_name})")}
+    if column_name not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}")
+
+# Triggers keeping places_fts in sync with places. The survey importer
+# suspends the insert and update triggers while it indexes a batch at once.
+PLACES_FTS_TRIGGERS = {
+    "places_fts_ai": """
+    CREATE TRIGGER IF NOT EXISTS places_fts_ai AFTER INSERT ON places
+    BEGIN
+        INSERT INTO places_fts(rowid, name, description, location_name)
+        VALUES (new.id, new.name, new.description, new.location_name);
+    END
+    """,
+    "places_fts_au": """
+    CREATE TRIGGER IF NOT EXISTS places_fts_au AFTER UPDATE OF name, description, location_name ON places
+    BEGIN
+        INSERT INTO places_fts(places_fts, rowid, name, description, location_name)
+        VALUES ('delete', old.id, old.name, old.description, old.location_name);
+        INSERT INTO places_fts(rowid, name, description, location_name)
+        VALUES (new.id, new.name, new.description, new.location_name);
+    END
+    """,
+    "places_fts_ad": """
+    CREATE TRIGGER IF NOT EXISTS places_fts_ad AFTER DELETE ON places
+    BEGIN
+        INSERT INTO places_fts(places_fts, rowid, name, description, location_name)
+        VALUES ('delete', old.id, old.name, old.description, old.location_name);
+    END
+    """,
+}
+
+# ------------------ Migrations ------------------
+
+@migration
+def create_places_rtree(conn: Connection):
+    _execute_all(conn, [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree
+        USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS places_rtree_ai AFTER INSERT ON places
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO places_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS places_rtree_au AFTER UPDATE OF latitude, longitude ON places
+        BEGIN
+            DELETE FROM places_rtree WHERE id = old.id;
+            INSERT INTO places_rtree
+            SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+            WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS places_rtree_ad AFTER DELETE ON places
+        BEGIN
+            DELETE FROM places_rtree WHERE id = old.id;
+        END
+        """,
+        """
+        INSERT OR REPLACE INTO places_rtree
+        SELECT id, latitude, latitude, longitude, longitude FROM places
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """,
+    ])
+
+@migration
+def create_places_fts(conn: Connection):
+    _execute_all(conn, [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS places_fts
+        USING fts5(name, description, location_name, content='places', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+        """,
+        *PLACES_FTS_TRIGGERS.values(),
+        "INSERT INTO places_fts(places_fts) VALUES ('rebuild')",
+    ])
+
+@migration
+def add_place_rating_aggregates(conn: Connection):
+    _add_column(conn, "places", "rating_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "places", "rating_sum", "FLOAT NOT NULL DEFAULT 0")
+    _execute_all(conn, [
+        """
+        UPDATE places SET rating_count = agg.rating_count, rating_sum = agg.rating_sum
+        FROM (SELECT place_id, count(*) AS rating_count, sum(rating) AS rating_sum FROM ratings GROUP BY place_id) AS agg
+        WHERE places.id = agg.place_id
+        """,
+    ])
+
+@migration
+def add_place_survey_key(conn: Connection):
+    _add_column(conn, "places", "code", "VARCHAR")
+    _add_column(conn, "places", "survey_no", "INTEGER")
+    _execute_all(conn, [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_places_code_survey_no ON places (code, survey_no)",
+    ])
+
+@migration
+def add_rating_histogram(conn: Connection):
+    for stars in range(1, 6):
+        _add_column(conn, "places", f"stars_{stars}_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "places", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_ratings_place_id_created_at ON ratings (place_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ratings_user_id_created_at ON ratings (user_id, created_at)",
+        # Bucket bounds match app/db/ratings.py
+        """
+        UPDATE places SET
+            stars_1_count = agg.stars_1, stars_2_count = agg.stars_2, stars_3_count = agg.stars_3,
+            stars_4_count = agg.stars_4, stars_5_count = agg.stars_5, message_count = agg.messages
+        FROM (
+            SELECT place_id,
+                   sum(rating < 1.5) AS stars_1,
+                   sum(rating >= 1.5 AND rating < 2.5) AS stars_2,
+                   sum(rating >= 2.5 AND rating < 3.5) AS stars_3,
+                   sum(rating >= 3.5 AND rating < 4.5) AS stars_4,
+                   sum(rating >= 4.5) AS stars_5,
+                   sum(length(trim(message)) > 0) AS messages
+            FROM ratings GROUP BY place_id
+        ) AS agg
+        WHERE places.id = agg.place_id
+        """,
+    ])
+
+@migration
+def index_places_average_rating(conn: Connection):
+    # ratings.place_id and ratings.user_id are covered by the created_at
+    # indexes of add_rating_histogram
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_places_average_rating ON places (average_rating)",
+        # Sampled statistics, so the planner knows the new indexes
+        "PRAGMA analysis_limit = 1000",
+        "ANALYZE",
+    ])
+
+# ------------------ Runner ------------------
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def upgrade(engine: Engine) -> int:
+    """Creates missing tables, applies pending migrations and returns the resulting schema version."""
+    with engine.begin() as conn:
+        models.Base.metadata.create_all(bind=conn)
+        version = get_schema_version(conn)
+        for number, fn in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            fn(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+            version = number
+    return version
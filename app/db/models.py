@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, Numeric, String, Table
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, Numeric, String, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -23,6 +23,12 @@ class Rating(Base):
     user = relationship('User', back_populates='ratings')
     place = relationship('Place', back_populates='ratings')
 
+    # Newest-first rating feeds of a place or of a user
+    __table_args__ = (
+        Index('ix_ratings_place_id_created_at', 'place_id', 'created_at'),
+        Index('ix_ratings_user_id_created_at', 'user_id', 'created_at'),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -49,12 +55,32 @@ class Place(Base):
     latitude = Column(Numeric(precision=10, scale=6))
     longitude = Column(Numeric(precision=10, scale=6))
     image_url = Column(String)
-    average_rating = Column(Float, default=0.0)
+    # Indexed for min_rating filters and the rating ordering
+    average_rating = Column(Float, default=0.0, index=True)
+    # Running rating aggregates, updated together with each new rating
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    # Rating histogram: ratings per star bucket (see app/db/ratings.py) and
+    # ratings with a written message
+    stars_1_count = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_2_count = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_3_count = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_4_count = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_5_count = Column(Integer, nullable=False, default=0, server_default='0')
+    message_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # Survey site code (Kode) and row number (No.) of places loaded by the CSV
+    # importer; together they identify a row across re-imports
+    code = Column(String, nullable=True)
+    survey_no = Column(Integer, nullable=True)
 
     # Back reference to users who saved this place
     users = relationship('User', secondary=user_place_association, back_populates='saved_places')
     ratings = relationship('Rating', back_populates='place')
-    
+
+    __table_args__ = (
+        Index('ix_places_code_survey_no', 'code', 'survey_no', unique=True),
+    )
+
 class OTPVerification(Base):
     __tablename__ = 'otp_verifications'
 
@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+from fastapi import HTTPException, status
+from sqlalchemy import String, tuple_, type_coerce
+
+# Opaque cursors for keyset pagination. A cursor holds the name of the
+# ordering it was issued for and the sort key of the last row of the page,
+# so the next page is an index range scan starting right after that row.
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot use {type(value).__name__} in a cursor")
+
+def _decode_value(column, value):
+    # Datetime keys travel as ISO strings. SQLite stores them as text and
+    # server defaults (CURRENT_TIMESTAMP) have no fractional seconds, while a
+    # bound datetime always gets them, so the key is compared in the stored
+    # format to keep rows of the same second on the right side of the cursor.
+    if isinstance(value, str):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return value
+        if python_type is datetime:
+            stored = datetime.fromisoformat(value).isoformat(sep=" ")
+            return type_coerce(stored, String)
+    return value
+
+def encode_cursor(order: str, key: Sequence) -> str:
+    payload = json.dumps({"o": order, "k": list(key)}, separators=(",", ":"), default=_encode_value)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order: str) -> list:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = payload["k"]
+    except (ValueError, TypeError, KeyError):
+        raise invalid_cursor
+    if payload.get("o") != order or not isinstance(key, list):
+        raise invalid_cursor
+    # Only values _encode_value and json produce; anything else is forged
+    if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in key):
+        raise invalid_cursor
+    return key
+
+def paginate(
+    query,
+    columns: Sequence,
+    key: Callable,
+    order: str,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    descending: bool = False,
+):
+    """Returns (rows, next_cursor) for `query` ordered by `columns`.
+
+    `key` maps a result row to its values for `columns`; `columns` must end
+    with a unique column so the ordering is total.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="limit must be at least 1")
+    if cursor:
+        values = decode_cursor(cursor, order)
+        if len(values) != len(columns):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        try:
+            values = [_decode_value(column, value) for column, value in zip(columns, values)]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    order_by = [column.desc() for column in columns] if descending else list(columns)
+    rows: List = query.order_by(*order_by).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(order, key(rows[-1]))
+    return rows, next_cursor
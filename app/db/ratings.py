@@ -0,0 +1,28 @@
+from typing import Optional
+from sqlalchemy import case, func
+
+# Ratings are floats from 0 to 5. They are counted in the star bucket they
+# round to, with 0 counted as 1 star: bucket n holds ratings below
+# STAR_BUCKET_BOUNDS[n - 1], and 5 stars holds the rest.
+STAR_BUCKET_BOUNDS = (1.5, 2.5, 3.5, 4.5)
+STARS = (1, 2, 3, 4, 5)
+
+def star_column(stars: int) -> str:
+    """Name of the places column counting ratings in the given star bucket."""
+    return f"stars_{stars}_count"
+
+def rating_stars(rating: float) -> int:
+    for stars, bound in enumerate(STAR_BUCKET_BOUNDS, start=1):
+        if rating < bound:
+            return stars
+    return 5
+
+def rating_stars_expression(rating_column):
+    """SQL equivalent of rating_stars, for set-based rebuilds."""
+    return case(*[(rating_column < bound, stars) for stars, bound in enumerate(STAR_BUCKET_BOUNDS, start=1)], else_=5)
+
+def has_message(message: Optional[str]) -> bool:
+    return bool(message and message.strip())
+
+def has_message_expression(message_column):
+    return case((func.length(func.trim(message_column)) > 0, 1), else_=0)
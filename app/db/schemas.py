@@ -1,7 +1,15 @@
 
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, condecimal
-from typing import Optional, List
+from typing import Dict, Generic, Optional, List, TypeVar
+
+T = TypeVar("T")
+
+# ------------------ Pagination Schemas ------------------
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 # ------------------ User Schemas ------------------
     
@@ -57,23 +65,63 @@ class PlaceResponse(PlaceBase):
     id: int
     distance: Optional[float] = None
     average_rating: Optional[float] = 0.0
+    # Survey site code of imported places
+    code: Optional[str] = None
+    snippet: Optional[str] = None
+    # Resized WebP copies of image_url: thumbnail, medium, webp
+    image_variants: Optional[Dict[str, str]] = None
     # users: Optional[List[UserBase]] = []
 
     class Config:
         orm_mode = True
 
-class UserResponse(UserBase):
+class UserProfileResponse(UserBase):
     id: int
     is_active: bool
-    saved_places: Optional[List[PlaceResponse]] = []
+    # Resized WebP copies of photo_url: thumbnail, medium, webp
+    photo_variants: Optional[Dict[str, str]] = None
 
     class Config:
         orm_mode = True
-        
+
+class UserResponse(UserProfileResponse):
+    saved_places: Optional[List[PlaceResponse]] = []
+
+class SavedPlacesBulk(BaseModel):
+    place_ids: List[int]
+
+# ------------------ Bulk Place Schemas ------------------
+
+class PlaceBulkUpdate(PlaceUpdate):
+    id: int
+
+class PlaceBulkDelete(BaseModel):
+    ids: List[int]
+
+class BulkItemResult(BaseModel):
+    # Position of the item in the request payload
+    index: int
+    id: Optional[int] = None
+    status: int
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    items: List[BulkItemResult]
+
 class RatingCreate(BaseModel):
     rating: float
     message: Optional[str] = None
 
+class RatingSummary(BaseModel):
+    place_id: int
+    count: int
+    average: float
+    # Number of ratings per star bucket, 1 to 5
+    stars: Dict[int, int]
+    with_message: int
+
 class RatingResponse(BaseModel):
     id: int
     user_id: int
@@ -0,0 +1,46 @@
+import re
+from typing import Optional
+from sqlalchemy import column, func, literal_column, table
+
+# SQLite FTS5 index over places(name, description, location_name), using the
+# places table as external content. Kept in sync by the triggers created in
+# app/db/migrations.py.
+places_fts = table(
+    "places_fts",
+    column("rowid"),
+    column("places_fts"),
+    column("name"),
+    column("description"),
+    column("location_name"),
+)
+
+# bm25 column weights: name, description, location_name
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+LOCATION_NAME_WEIGHT = 5.0
+
+SNIPPET_START = "<b>"
+SNIPPET_END = "</b>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 16
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def build_match_query(search: str) -> Optional[str]:
+    """Turns free text into an FTS5 query matching every word, the last one as a prefix."""
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def match(query: str):
+    return places_fts.c.places_fts.match(query)
+
+def rank_expression():
+    """bm25 relevance; lower is better."""
+    return func.bm25(literal_column("places_fts"), NAME_WEIGHT, DESCRIPTION_WEIGHT, LOCATION_NAME_WEIGHT)
+
+def snippet_expression():
+    return func.snippet(literal_column("places_fts"), -1, SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS)
@@ -0,0 +1,164 @@
+import heapq
+import math
+from typing import Optional, Sequence, Tuple
+from sqlalchemy import column, table
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; distances fall back to plain Python
+    np = None
+
+# SQLite R*Tree virtual table mirroring places.latitude/longitude.
+# Kept in sync by the triggers created in app/db/migrations.py.
+places_rtree = table(
+    "places_rtree",
+    column("id"),
+    column("min_lat"),
+    column("max_lat"),
+    column("min_lon"),
+    column("max_lon"),
+)
+
+EARTH_RADIUS_KM = 6371.0088
+# WGS84 ellipsoid
+WGS84_A_KM = 6378.137
+WGS84_E2 = 6.69437999014e-3
+# Bounding boxes are widened by this fraction, so rounding never drops a
+# place on the edge of the circle the haversine check accepts
+BOUNDING_BOX_PAD = 1e-3
+
+# Radius of the first ring searched by nearest-place queries, doubled until
+# enough places are found or the requested radius is reached.
+NEARBY_INITIAL_RADIUS_KM = 2.0
+
+def bounding_boxes(lat: float, lon: float, radius_km: float):
+    """Returns (min_lat, max_lat, min_lon, max_lon) boxes that together enclose a circle of radius_km.
+
+    The circle is the one of haversine_km, on the sphere of EARTH_RADIUS_KM.
+    A circle crossing the antimeridian gives two boxes, one on each side; a
+    circle around a pole spans all longitudes.
+    """
+    angle = radius_km * (1 + BOUNDING_BOX_PAD) / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angle)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+    # Widest longitude of the circle, reached north or south of its center
+    lon_delta = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    min_lon, max_lon = lon - lon_delta, lon + lon_delta
+    if min_lon < -180.0:
+        return [(min_lat, max_lat, -180.0, max_lon), (min_lat, max_lat, min_lon + 360.0, 180.0)]
+    if max_lon > 180.0:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360.0)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+# ------------------ Distance Formulas ------------------
+# Errors against the WGS84 geodesic, measured for points within 500 km of
+# Pulo Aceh (latitudes around 5 degrees north):
+#   geodesic         geopy's Karney algorithm; exact, about 125 us per pair
+#   haversine        sphere of the mean Earth radius; off by up to 0.56%
+#                    (5.6 m per km), most along meridians near the equator
+#   equirectangular  plane with the ellipsoid's radii of curvature at the
+#                    pair's mean latitude; within 0.1 m up to 50 km and
+#                    0.013% up to 500 km
+# Both cheap formulas take about 0.6 us per pair in plain Python and far
+# less with numpy.
+DISTANCE_FORMULAS = ("geodesic", "haversine", "equirectangular")
+# Ranking many places by geodesic distance uses this vectorizable stand-in;
+# geodesic distances are then computed for the returned rows only
+RANKING_FORMULA = "equirectangular"
+
+class Coordinates:
+    """Latitudes and longitudes of many points, ready for one distance pass.
+
+    Holds numpy arrays when numpy is installed and lists otherwise.
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float]):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        if np is not None:
+            self._lat = np.radians(np.asarray(latitudes, dtype=float))
+            self._lon = np.radians(np.asarray(longitudes, dtype=float))
+            self._cos_lat = np.cos(self._lat)
+        else:
+            self._lat = [math.radians(value) for value in latitudes]
+            self._lon = [math.radians(value) for value in longitudes]
+            self._cos_lat = [math.cos(value) for value in self._lat]
+
+    def __len__(self) -> int:
+        return len(self._lat)
+
+    def distances_km(self, lat: float, lon: float, formula: str = "haversine"):
+        """Distances in kilometers from (lat, lon) to every point, in order."""
+        if formula == "geodesic":
+            # geopy pulls in its geocoders and requests; only load it when needed
+            from geopy.distance import geodesic
+
+            return [geodesic((lat, lon), point).kilometers for point in zip(self.latitudes, self.longitudes)]
+        if formula == "haversine":
+            return self._haversine(math.radians(lat), math.radians(lon))
+        if formula == "equirectangular":
+            return self._equirectangular(math.radians(lat), math.radians(lon))
+        raise ValueError(f"Unknown distance formula: {formula}")
+
+    def _haversine(self, phi: float, lam: float):
+        cos_phi = math.cos(phi)
+        if np is not None:
+            a = np.sin((self._lat - phi) / 2) ** 2 + cos_phi * self._cos_lat * np.sin((self._lon - lam) / 2) ** 2
+            return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        return [
+            2 * EARTH_RADIUS_KM * asin(sqrt(min(1.0, sin((lat2 - phi) / 2) ** 2 + cos_phi * cos_lat2 * sin((lon2 - lam) / 2) ** 2)))
+            for lat2, lon2, cos_lat2 in zip(self._lat, self._lon, self._cos_lat)
+        ]
+
+    def _equirectangular(self, phi: float, lam: float):
+        if np is not None:
+            mean_lat = (self._lat + phi) / 2
+            w2 = 1 - WGS84_E2 * np.sin(mean_lat) ** 2
+            # Meridional and prime vertical radii of curvature
+            meridional = WGS84_A_KM * (1 - WGS84_E2) / (w2 * np.sqrt(w2))
+            vertical = WGS84_A_KM / np.sqrt(w2)
+            d_lon = (self._lon - lam + math.pi) % (2 * math.pi) - math.pi
+            return np.hypot(meridional * (self._lat - phi), vertical * np.cos(mean_lat) * d_lon)
+        sin, cos, sqrt, hypot, pi = math.sin, math.cos, math.sqrt, math.hypot, math.pi
+        distances = []
+        for lat2, lon2 in zip(self._lat, self._lon):
+            mean_lat = (lat2 + phi) / 2
+            w2 = 1 - WGS84_E2 * sin(mean_lat) ** 2
+            d_lon = (lon2 - lam + pi) % (2 * pi) - pi
+            distances.append(hypot(
+                WGS84_A_KM * (1 - WGS84_E2) / (w2 * sqrt(w2)) * (lat2 - phi),
+                WGS84_A_KM / sqrt(w2) * cos(mean_lat) * d_lon,
+            ))
+        return distances
+
+def nearest(distances, ids, count: int, after: Optional[Tuple[float, int]] = None):
+    """The `count` smallest (distance, id) pairs greater than `after`, in order."""
+    if np is not None:
+        distances = np.asarray(distances, dtype=float)
+        ids = np.asarray(ids)
+        if after is not None:
+            keep = (distances > after[0]) | ((distances == after[0]) & (ids > after[1]))
+            distances, ids = distances[keep], ids[keep]
+        if count < len(distances):
+            # Everything up to the count-th smallest distance, ties included
+            bound = np.partition(distances, count - 1)[count - 1]
+            keep = distances <= bound
+            distances, ids = distances[keep], ids[keep]
+        order = np.lexsort((ids, distances))[:count]
+        return list(zip(distances[order].tolist(), ids[order].tolist()))
+    pairs = zip(distances, ids)
+    if after is not None:
+        pairs = (pair for pair in pairs if pair > after)
+    return heapq.nsmallest(count, pairs)
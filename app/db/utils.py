@@ -1,27 +1,105 @@
+import asyncio
+import contextvars
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
 from urllib.parse import urljoin
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Optional, Tuple
 import jwt
 from pydantic import BaseModel
 
 from app.db.models import User
 from app.db.schemas import UserBase
-from app.dependencies import FASTAPI_PORT, FASTAPI_URL
+from app.dependencies import BCRYPT_ROUNDS, FASTAPI_PORT, FASTAPI_URL, PASSWORD_HASH_WORKERS
 
-# Set up password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hashing context, created on first use. Hashes with a cost
+    other than BCRYPT_ROUNDS are reported as needing an update."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class PasswordHasherPool:
+    """Runs bcrypt work on a fixed number of threads and tracks queue depth.
+
+    bcrypt releases the GIL, so the threads hash in parallel while the event
+    loop and request threads only wait on the result.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def submit(self, fn, *args) -> Future:
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        # The caller's context goes along, so profiling can attribute the work
+        return self._executor.submit(self._run, contextvars.copy_context(), submitted_at, fn, *args)
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": 1000 * self.total_wait_seconds / self.completed if self.completed else 0.0,
+                "avg_run_ms": 1000 * self.total_run_seconds / self.completed if self.completed else 0.0,
+            }
+
+    def _run(self, context: contextvars.Context, submitted_at: float, fn, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_seconds += started_at - submitted_at
+        try:
+            return context.run(fn, *args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_run_seconds += time.perf_counter() - started_at
+
+password_hasher = PasswordHasherPool(max_workers=PASSWORD_HASH_WORKERS)
 
 def hash_password(password: str) -> str:
     """Hashes a plain text password."""
-    return pwd_context.hash(password)
+    return password_hasher.submit(get_pwd_context().hash, password).result()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain text password against the hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.submit(get_pwd_context().verify, plain_password, hashed_password).result()
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verifies a password; also returns a new hash when the stored one uses a different cost."""
+    return password_hasher.submit(get_pwd_context().verify_and_update, plain_password, hashed_password).result()
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(get_pwd_context().hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.run(get_pwd_context().verify_and_update, plain_password, hashed_password)
 
 def get_full_image_url(image_path: str) -> str:
     base_url = f"{FASTAPI_URL}:{FASTAPI_PORT}/"
-    return urljoin(base_url, image_path)
\ No newline at end of file
+    return urljoin(base_url, image_path)
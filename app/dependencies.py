@@ -9,9 +9,95 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 GMAIL_EMAIL = os.getenv("GMAIL_EMAIL")
 GMAIL_PASSWORD = os.getenv("GMAIL_PASSWORD")
+# Outbound mail; GMAIL_EMAIL/GMAIL_PASSWORD are the SMTP credentials
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() in ("1", "true", "yes")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "1"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "5"))
+
 FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost")
 FASTAPI_PORT = os.getenv("FASTAPI_PORT", "8000")
 
+# Photo uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+# Internal nginx location that serves the static directory, e.g. /_static/;
+# when set, file bodies are sent by nginx (X-Accel-Redirect) instead of Python
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+
+# Access tokens carry the user's claims and are short-lived; refresh tokens
+# are exchanged for new token pairs at /users/auth/refresh-token
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", str(60 * 24 * 30)))
+
+# bcrypt cost factor; existing hashes with another cost are re-hashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+
+PLACE_CACHE_ENABLED = os.getenv("PLACE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PLACE_CACHE_MAXSIZE = int(os.getenv("PLACE_CACHE_MAXSIZE", "1024"))
+PLACE_CACHE_TTL = float(os.getenv("PLACE_CACHE_TTL", "300"))
+
+# Upper bound on the `limit` of paginated list endpoints
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+# Upper bound on the `radius_km` of /places/nearby
+NEARBY_MAX_RADIUS_KM = float(os.getenv("NEARBY_MAX_RADIUS_KM", "200"))
+
+# Upper bound on the items of one /places/bulk request
+PLACE_BULK_MAX_ITEMS = int(os.getenv("PLACE_BULK_MAX_ITEMS", "10000"))
+
+# Responses of at least this many bytes are compressed (brotli or gzip)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Primary database; ASYNC_DATABASE_URL defaults to the same database through
+# its asyncio driver (aiosqlite for SQLite)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+# Optional read replica for GET endpoints that use get_read_db; empty means
+# reads go to the primary
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+# How far the replica may lag behind; cached place data refilled within this
+# many seconds of a write is read from the primary
+READ_REPLICA_MAX_LAG_SECONDS = float(os.getenv("READ_REPLICA_MAX_LAG_SECONDS", "10"))
+# Connection pool of each engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a pooled connection is replaced; -1 keeps it forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+# "production" tunes every SQLite connection (WAL, synchronous=NORMAL, mmap,
+# page cache, busy timeout) and refreshes planner statistics periodically
+DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "default")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, as in PRAGMA cache_size
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Seconds between ANALYZE runs in the production profile; 0 disables them
+DB_OPTIMIZE_INTERVAL = float(os.getenv("DB_OPTIMIZE_INTERVAL", "3600"))
+# Rows sampled per index by the periodic ANALYZE (PRAGMA analysis_limit)
+SQLITE_ANALYSIS_LIMIT = int(os.getenv("SQLITE_ANALYSIS_LIMIT", "1000"))
+
+# Prometheus metrics at /metrics; scrapes must send "Authorization: Bearer
+# <METRICS_TOKEN>", and the endpoint is not mounted without a token
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# SQL statements taking at least this long are logged with their route
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Request profiling: admins opt in per request; with PROFILE_SAMPLE_RATE=N
+# about one in N requests is also profiled (0 disables sampling). Reports
+# are kept in PROFILE_DIR, the newest PROFILE_STORE_MAX of them
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_STORE_MAX = int(os.getenv("PROFILE_STORE_MAX", "200"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
 async def get_token_header(x_token: Annotated[str, Header()]):
     if x_token != "fake-super-secret-token":
         raise HTTPException(status_code=400, detail="X-Token header invalid")
@@ -0,0 +1,258 @@
+import logging
+import queue
+import threading
+import time
+from email.message import Message
+from typing import Optional
+
+from app.dependencies import (
+    GMAIL_EMAIL,
+    GMAIL_PASSWORD,
+    MAIL_BATCH_SIZE,
+    MAIL_MAX_RETRIES,
+    MAIL_WORKERS,
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_USE_SSL,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MailQueue:
+    """Delivers outbound email from background threads.
+
+    Each worker keeps one authenticated SMTP connection open and reuses it
+    for every message, sending queued messages in batches. Failed messages
+    are retried with exponential backoff; a broken connection is reopened
+    on the next attempt.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_ssl: bool = True,
+        workers: int = 1,
+        batch_size: int = 20,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 300.0,
+        idle_check_seconds: float = 30.0,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads = []
+        # Pending retries: timer -> (message, attempt, enqueued_at)
+        self._timers = {}
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "batches": 0,
+            "connections_opened": 0,
+        }
+        self._total_delivery_seconds = 0.0
+
+    # ------------------ Public API ------------------
+
+    def send(self, message: Message):
+        """Queues a message for delivery and returns immediately."""
+        self._start()
+        self._count("enqueued")
+        self._queue.put((message, 0, time.monotonic()))
+
+    def stop(self, timeout: float = 10.0):
+        """Delivers what is already queued, then stops the workers.
+
+        Messages waiting for a retry get one last attempt now instead of
+        being dropped; if that fails too they are logged and counted as failed.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            timers, self._timers = self._timers, {}
+            self._stopping = True
+        for timer, item in timers.items():
+            timer.cancel()
+            self._queue.put(item)
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queued"] = self._queue.qsize()
+            stats["pending_retries"] = len(self._timers)
+            stats["workers"] = len(self._threads)
+            stats["avg_delivery_ms"] = 1000 * self._total_delivery_seconds / stats["sent"] if stats["sent"] else 0.0
+        return stats
+
+    # ------------------ Workers ------------------
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"mail-worker-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        # smtplib is only loaded once mail is sent, not when the app starts
+        import smtplib
+
+        connection = None
+        last_used = 0.0
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._count("batches")
+            for message, attempt, enqueued_at in batch:
+                try:
+                    if connection is not None and time.monotonic() - last_used > self.idle_check_seconds:
+                        connection = self._check_connection(connection)
+                    if connection is None:
+                        connection = self._connect()
+                    connection.send_message(message)
+                    last_used = time.monotonic()
+                    self._delivered(enqueued_at)
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Permanent rejection; the connection itself is fine
+                    self._give_up(message, attempt, e)
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code >= 500:
+                        self._give_up(message, attempt, e)
+                    else:
+                        self._close(connection)
+                        connection = None
+                        self._retry(message, attempt, enqueued_at, e)
+                except (smtplib.SMTPException, OSError) as e:
+                    self._close(connection)
+                    connection = None
+                    self._retry(message, attempt, enqueued_at, e)
+                except Exception as e:
+                    # A malformed message must not take the worker down
+                    logger.exception("Cannot send email to %s", message["To"])
+                    self._give_up(message, attempt, e)
+            if stop:
+                break
+        self._close(connection)
+
+    def _connect(self):
+        import smtplib
+
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        connection = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        self._count("connections_opened")
+        return connection
+
+    def _check_connection(self, connection):
+        import smtplib
+
+        try:
+            if connection.noop()[0] == 250:
+                return connection
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._close(connection)
+        return None
+
+    def _close(self, connection):
+        if connection is None:
+            return
+        import smtplib
+
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def _retry(self, message: Message, attempt: int, enqueued_at: float, error: Exception):
+        if attempt >= self.max_retries:
+            self._give_up(message, attempt, error)
+            return
+        delay = min(self.backoff_seconds * 2 ** attempt, self.max_backoff_seconds)
+        item = (message, attempt + 1, enqueued_at)
+
+        def requeue():
+            with self._lock:
+                # Gone when stop() took the retry over
+                if self._timers.pop(timer, None) is None:
+                    return
+            self._queue.put(item)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._lock:
+            # A failure while stopping gets no further retries
+            stopping = self._stopping
+            if not stopping:
+                self._timers[timer] = item
+        if stopping:
+            self._give_up(message, attempt, error)
+            return
+        logger.warning("Email to %s failed (%s), retrying in %.1fs", message["To"], error, delay)
+        self._count("retried")
+        timer.start()
+
+    def _give_up(self, message: Message, attempt: int, error: Exception):
+        self._count("failed")
+        logger.error("Giving up on email to %s after %d attempt(s): %s", message["To"], attempt + 1, error)
+
+    def _delivered(self, enqueued_at: float):
+        with self._lock:
+            self._counters["sent"] += 1
+            self._total_delivery_seconds += time.monotonic() - enqueued_at
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+mail_queue = MailQueue(
+    host=SMTP_HOST,
+    port=SMTP_PORT,
+    username=GMAIL_EMAIL,
+    password=GMAIL_PASSWORD,
+    use_ssl=SMTP_USE_SSL,
+    workers=MAIL_WORKERS,
+    batch_size=MAIL_BATCH_SIZE,
+    max_retries=MAIL_MAX_RETRIES,
+)
@@ -1,25 +1,97 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.db import models
+from app.compression import CompressionMiddleware
+from app.db import database, migrations
 from app.db.database import engine
-from app.routers import user, place, otp
+from app.dependencies import (
+    BROTLI_QUALITY,
+    COMPRESSION_MINIMUM_SIZE,
+    DATABASE_PROFILE,
+    DB_OPTIMIZE_INTERVAL,
+    GZIP_LEVEL,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+)
+from app.mail import mail_queue
+from app.media import MediaFiles, UploadLimitMiddleware, shutdown_media_workers
+from app.metrics import MetricsMiddleware
+from app.profiling import ProfilingMiddleware
+from app.routers import admin, metrics, user, place, otp
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+async def optimize_database_periodically(interval: float):
+    while True:
+        try:
+            await run_in_threadpool(database.optimize)
+        except Exception:
+            logger.exception("Database optimize failed")
+        await asyncio.sleep(interval)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=['*'],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def check_schema_version():
+    # Schema changes are applied by `python -m app.cli migrate`, not at import
+    with engine.connect() as conn:
+        version = migrations.get_schema_version(conn)
+    if version < len(migrations.MIGRATIONS):
+        raise RuntimeError(
+            f"Database schema is at version {version} of {len(migrations.MIGRATIONS)}; run `python -m app.cli migrate`"
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_schema_version()
+    optimizer = None
+    if DATABASE_PROFILE == "production" and DB_OPTIMIZE_INTERVAL > 0:
+        optimizer = asyncio.create_task(optimize_database_periodically(DB_OPTIMIZE_INTERVAL))
+    yield
+    if optimizer is not None:
+        optimizer.cancel()
+    # Flush queued emails before the worker exits
+    mail_queue.stop()
+    shutdown_media_workers()
+
+def create_app() -> FastAPI:
+    """Builds the API application; importing this module has no side effects on the database."""
+    app = FastAPI(lifespan=lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=['*'],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+        gzip_level=GZIP_LEVEL,
+        brotli_quality=BROTLI_QUALITY,
+    )
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(UploadLimitMiddleware)
+    if METRICS_ENABLED:
+        # Added last so it is outermost and times the other middleware too
+        app.add_middleware(MetricsMiddleware)
+
+    app.mount("/static", MediaFiles(directory="static"), name="static")
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.include_router(user.router)
+    app.include_router(place.router)
+    app.include_router(otp.router)
+    app.include_router(admin.router)
+    if METRICS_ENABLED:
+        if METRICS_TOKEN:
+            app.include_router(metrics.router)
+        else:
+            # The stats of /admin/stats must not be public
+            logger.warning("METRICS_TOKEN is not set; /metrics is not served")
+    return app
 
-app.include_router(user.router)
-app.include_router(place.router)
-app.include_router(otp.router)
\ No newline at end of file
+# For `fastapi dev app/main.py` and `uvicorn app.main:app`
+app = create_app()
@@ -0,0 +1,359 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows; the photo lock then only covers this process
+    fcntl = None
+
+from fastapi import HTTPException, status
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.dependencies import MAX_UPLOAD_BYTES, MEDIA_ACCEL_REDIRECT_PREFIX, MEDIA_WORKERS
+
+logger = logging.getLogger(__name__)
+
+PHOTO_DIR = Path("static/photos")
+# Outside static/, so neither is served. Uploads are written to the temporary
+# directory first and moved into PHOTO_DIR when complete; it sits next to
+# static/ to stay on the same filesystem, where that move is atomic.
+PHOTO_TMP_DIR = Path(".photos.tmp")
+PHOTO_LOCK_PATH = Path(".photos.lock")
+CHUNK_SIZE = 1024 * 1024
+
+# Resized WebP copies generated for every stored photo: name -> max edge in
+# pixels (None keeps the original size)
+VARIANTS = {
+    "thumbnail": 320,
+    "medium": 1024,
+    "webp": None,
+}
+WEBP_QUALITY = 80
+
+# Room for the multipart boundaries and part headers around an upload
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Stored photos are named after the SHA-256 of their content
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# A content-addressed photo is shared by every row with the same image. A
+# request that reuses one commits its row only after store_photo returns, so
+# a photo stored or reused this recently is never deleted inline; `python -m
+# app.cli sweep-photos` removes it later if it really is unreferenced.
+PHOTO_REUSE_GRACE_SECONDS = 3600
+
+# Content-addressed files never change, so clients may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=3600, must-revalidate"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_photo_lock = threading.Lock()
+
+def _image_extension(header: bytes) -> Optional[str]:
+    for signature, extension in _SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"Photo exceeds the {MAX_UPLOAD_BYTES} byte limit",
+    )
+
+# ------------------ Storage ------------------
+
+@contextmanager
+def photos_locked():
+    """Serializes reusing and deleting photos, across threads and worker processes."""
+    with _photo_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(PHOTO_LOCK_PATH, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def store_photo(photo: BinaryIO) -> str:
+    """Streams an uploaded image to static/photos and returns its path.
+
+    The upload is copied in chunks while being hashed, so it is never held in
+    memory, and rejected once it exceeds MAX_UPLOAD_BYTES. Identical images
+    are stored once under their content hash.
+    """
+    PHOTO_DIR.mkdir(parents=True, exist_ok=True)
+    PHOTO_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    fd, tmp_name = tempfile.mkstemp(dir=PHOTO_TMP_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while chunk := photo.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise upload_too_large()
+                if len(header) < 16:
+                    header += chunk[:16]
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        extension = _image_extension(header)
+        if extension is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+
+        photo_path = PHOTO_DIR / f"{digest.hexdigest()}{extension}"
+        with photos_locked():
+            if photo_path.exists():
+                # Marks the reuse, so the photo is not deleted before our row commits
+                os.utime(photo_path)
+                os.unlink(tmp_name)
+                reused = True
+            else:
+                # mkstemp creates owner-only files; photos are public
+                os.chmod(tmp_name, 0o644)
+                os.replace(tmp_name, photo_path)
+                reused = False
+        if not reused:
+            schedule_variants(photo_path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+    return str(photo_path)
+
+def delete_photo(photo_url: str) -> bool:
+    photo_path = Path(photo_url)
+    for variant_path in variant_paths(photo_path).values():
+        if variant_path.exists():
+            variant_path.unlink()
+    if photo_path.exists():
+        photo_path.unlink()
+        return True
+    return False
+
+def delete_unused_photo(photo_url: str) -> bool:
+    """Deletes a photo the caller found unreferenced in the database.
+
+    A content-addressed photo stored or reused within PHOTO_REUSE_GRACE_SECONDS
+    is kept, since another request may be about to commit a reference to it.
+    """
+    photo_path = Path(photo_url)
+    with photos_locked():
+        if is_content_addressed(photo_path):
+            try:
+                if time.time() - photo_path.stat().st_mtime < PHOTO_REUSE_GRACE_SECONDS:
+                    return False
+            except FileNotFoundError:
+                return False
+        return delete_photo(photo_url)
+
+def sweep_unused_photos(is_in_use: Callable[[str], bool]) -> int:
+    """Deletes content-addressed photos that no row references; returns how many.
+
+    Temporary files left by crashed uploads are removed too.
+    """
+    if PHOTO_TMP_DIR.is_dir():
+        for tmp_path in PHOTO_TMP_DIR.iterdir():
+            try:
+                if time.time() - tmp_path.stat().st_mtime >= PHOTO_REUSE_GRACE_SECONDS:
+                    tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+    if not PHOTO_DIR.is_dir():
+        return 0
+    deleted = 0
+    for photo_path in PHOTO_DIR.iterdir():
+        if photo_path.suffix == ".part" or not is_content_addressed(photo_path):
+            continue
+        photo_url = photo_path.as_posix()
+        if not is_in_use(photo_url) and delete_unused_photo(photo_url):
+            deleted += 1
+    return deleted
+
+# ------------------ Variants ------------------
+
+def is_content_addressed(photo_path: Path) -> bool:
+    return bool(_CONTENT_HASH_RE.match(photo_path.stem))
+
+def variant_paths(photo_path: Path) -> Dict[str, Path]:
+    if not is_content_addressed(photo_path):
+        return {}
+    return {name: photo_path.with_name(f"{photo_path.stem}_{name}.webp") for name in VARIANTS}
+
+def get_variant_paths(photo_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """Paths of the resized copies of a stored photo that exist, or None when there are none.
+
+    Variants are missing for legacy photos, while they are being generated,
+    after a failed generation and when Pillow is not installed.
+    """
+    if not photo_url:
+        return None
+    variants = {name: path.as_posix() for name, path in variant_paths(Path(photo_url)).items() if path.exists()}
+    return variants or None
+
+def generate_variants(photo_path: str):
+    """Writes the WebP variants of one photo. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    source = Path(photo_path)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for name, path in variant_paths(source).items():
+            max_edge = VARIANTS[name]
+            variant = image.copy()
+            if max_edge is not None:
+                variant.thumbnail((max_edge, max_edge))
+            tmp_path = PHOTO_TMP_DIR / f"{path.name}.part"
+            variant.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+
+def schedule_variants(photo_path: Path):
+    """Queues variant generation on the media process pool."""
+    global _executor
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping variants for %s", photo_path)
+        return
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS)
+    future = _executor.submit(generate_variants, str(photo_path))
+    future.add_done_callback(_log_variant_failure)
+
+def _log_variant_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Failed to generate photo variants: %s", error)
+
+# ------------------ Upload Limit ------------------
+
+class UploadLimitMiddleware:
+    """Rejects multipart bodies larger than an upload may be, before they are parsed.
+
+    Starlette spools the whole multipart body to a temporary file before the
+    endpoint runs, so store_photo's own check comes too late to save
+    bandwidth or disk. A Content-Length over the limit is answered with 413
+    right away; otherwise the received bytes are counted and reading stops
+    with a 413 once they pass the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+        content_length = headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise upload_too_large()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except HTTPException as e:
+            if e.status_code != status.HTTP_413_CONTENT_TOO_LARGE or response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send):
+        error = upload_too_large()
+        # The client may still be sending; close the connection after the response
+        response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"connection": "close"})
+        await response(scope, receive, send)
+
+# ------------------ Serving ------------------
+
+def media_headers(filename: str) -> Dict[str, str]:
+    stem = Path(filename).stem
+    content_hash = stem.split("_", 1)[0]
+    if not _CONTENT_HASH_RE.match(content_hash):
+        return {"cache-control": MUTABLE_CACHE_CONTROL}
+    # The name is derived from the content, which makes it a strong validator
+    return {"cache-control": IMMUTABLE_CACHE_CONTROL, "etag": f'"{stem}"'}
+
+class MediaFiles(StaticFiles):
+    """StaticFiles with cache headers suited to content-addressed photos.
+
+    Content-hash names are served as immutable for a year with a strong ETag
+    derived from the name; other files get a short, revalidated max-age.
+    Range requests and zero-copy `http.response.pathsend` come from
+    Starlette's FileResponse. With MEDIA_ACCEL_REDIRECT_PREFIX set, the body
+    is left to a fronting nginx through X-Accel-Redirect, which sends it
+    with sendfile.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = media_headers(os.path.basename(full_path))
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if MEDIA_ACCEL_REDIRECT_PREFIX and status_code == 200:
+            relative_path = Path(os.path.relpath(full_path, self.directory)).as_posix()
+            accel_headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+            accel_headers["x-accel-redirect"] = MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative_path
+            return Response(headers=accel_headers, media_type=response.media_type)
+        return response
+
+def shutdown_media_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,300 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.dependencies import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+# Prometheus metrics kept in process memory and rendered in the text
+# exposition format. Each uvicorn worker has its own values, so scrape the
+# workers separately or run one worker per instance.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROW_COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+# ------------------ Metric Types ------------------
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield from self.header()
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> (per-bucket counts, sum)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            counts, _ = entry = self._values.setdefault(labels, [[0] * len(self.buckets), 0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            entry[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield from self.header()
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+class StatsCollector:
+    """Exports the numbers of a stats() dict, read at scrape time."""
+
+    def __init__(self, prefix: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = set(counters)
+
+    def render(self) -> Iterable[str]:
+        for key, value in self.stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+            is_counter = key in self.counters
+            name = f"{self.prefix}_{key}_total" if is_counter else f"{self.prefix}_{key}"
+            yield f"# TYPE {name} {'counter' if is_counter else 'gauge'}"
+            yield f"{name} {_format_value(float(value))}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                logger.exception("Cannot render metric %s", getattr(metric, "name", metric))
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"),
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route"),
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests being handled.", ("method",),
+))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements per HTTP request.", ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+))
+http_request_db_rows = registry.register(Histogram(
+    "http_request_db_rows", "Rows fetched or written per HTTP request.", ("method", "route"), buckets=ROW_COUNT_BUCKETS,
+))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements per HTTP request.", ("method", "route"),
+))
+db_slow_queries = registry.register(Counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ("route",),
+))
+
+# ------------------ Request Accounting ------------------
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "rows", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_name(self.scope)
+
+# Stats of the request being handled; copied into threadpool workers with the context
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def route_name(scope) -> str:
+    # The route template, e.g. /places/{place_id}, keeps the label set small
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Records latency, status and SQL work of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress.dec(method)
+            current_request.reset(token)
+            route = stats.route
+            http_requests.inc(method, route, str(status_code))
+            http_request_duration.observe(elapsed, method, route)
+            http_request_db_queries.observe(stats.queries, method, route)
+            http_request_db_rows.observe(stats.rows, method, route)
+            http_request_db_duration.observe(stats.db_seconds, method, route)
+
+# ------------------ SQL Accounting ------------------
+
+class CountingCursor(sqlite3.Cursor):
+    """Counts the rows fetched for the current request."""
+
+    def _count(self, rows: int):
+        stats = current_request.get()
+        if stats is not None:
+            stats.rows += rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def instrument_engine(engine: Engine):
+    """Adds per-request SQL accounting and the slow query log to an engine."""
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    if engine.dialect.driver == "pysqlite":
+        # Rows returned by SELECTs are only known as they are fetched.
+        # The async driver fetches on its own thread, outside the request
+        # context, so only its written rows are counted.
+        event.listen(engine, "do_connect", _use_counting_connection)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def _use_counting_connection(dialect, connection_record, cargs, cparams):
+    cparams.setdefault("factory", CountingConnection)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        db_slow_queries.inc(route)
+        slow_query_logger.warning(
+            "Slow query (%.1f ms) in %s %s: %s",
+            elapsed * 1000,
+            stats.scope["method"] if stats is not None else "-",
+            route,
+            # Parameters are left out; they can hold passwords and tokens
+            _WHITESPACE.sub(" ", statement).strip()[:2000],
+        )
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import Context, ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.auth.jwt import ACCESS_TOKEN_TYPE, decode_token
+from app.dependencies import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_SAMPLE_RATE, PROFILE_STORE_MAX, SECRET_KEY
+from app.metrics import current_request, route_name
+
+logger = logging.getLogger(__name__)
+
+# Where the time of a stack sample goes. The innermost frame matching a rule
+# decides, so bcrypt called from a router counts as bcrypt; rules are tried
+# in order for each frame, and frames matching none are looked through.
+CATEGORY_RULES = (
+    ("bcrypt", ("/passlib/", "/bcrypt/", "/app/db/utils.py")),
+    ("db", ("/sqlalchemy/", "/aiosqlite/", "/sqlite3/", "/app/db/")),
+    ("auth", ("/jwt/", "/app/auth/")),
+    ("serialization", (
+        "/pydantic/", "/pydantic_core/", "/json/", "/fastapi/encoders.py", "/starlette/responses.py",
+        "/app/serialization.py", "/app/compression.py",
+    )),
+    ("endpoint", ("/app/routers/",)),
+    ("routing", ("/starlette/", "/fastapi/", "/anyio/", "/app/")),
+)
+# FastAPI's response validation lives in its routing module
+CATEGORY_FUNCTIONS = {"serialize_response": "serialization"}
+# A thread whose innermost frame is here is blocked, e.g. on the bcrypt pool
+WAITING_MODULES = ("/threading.py", "/concurrent/futures/", "/queue.py")
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Profile of the request being handled; threadpool workers and the password
+# hashing threads get a copy of the request's context
+current_profile: ContextVar[Optional["ProfileSession"]] = ContextVar("current_profile", default=None)
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    _, found, package_path = filename.rpartition("site-packages/")
+    if not found:
+        package_path = os.path.relpath(filename) if filename.startswith(os.getcwd()) else os.path.basename(filename)
+    # co_qualname is new in Python 3.11
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({package_path})"
+
+def frame_category(code) -> Optional[str]:
+    category = CATEGORY_FUNCTIONS.get(code.co_name)
+    if category is not None:
+        return category
+    filename = code.co_filename
+    for name, fragments in CATEGORY_RULES:
+        if any(fragment in filename for fragment in fragments):
+            return name
+    return None
+
+# ------------------ Sessions ------------------
+
+class ProfileSession:
+    """Stack samples of one request, aggregated as they arrive."""
+
+    def __init__(self, scope, trigger: str):
+        self.id = uuid.uuid4().hex
+        self.scope = scope
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.finished = None
+        self.samples = 0
+        self.sampled_seconds = 0.0
+        self.categories: Dict[str, float] = {}
+        self.stacks: Dict[str, float] = {}
+        self.status_code = 500
+
+    def add(self, codes: List, weight: float):
+        """Adds one sample; `codes` runs from the request's entry point to the innermost frame."""
+        category = "other"
+        for code in reversed(codes):
+            found = frame_category(code)
+            if found is not None:
+                category = found
+                break
+        self.samples += 1
+        self.sampled_seconds += weight
+        self.categories[category] = self.categories.get(category, 0.0) + weight
+        stack = ";".join(frame_label(code) for code in codes)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + weight
+
+    def report(self, stats=None) -> dict:
+        wall = self.finished - self.started
+        categories = {name: round(1000 * seconds, 3) for name, seconds in sorted(self.categories.items(), key=lambda item: -item[1])}
+        # Time the request spent awaiting: I/O, the threadpool queue, other tasks
+        categories["await"] = round(max(0.0, 1000 * (wall - self.sampled_seconds)), 3)
+        report = {
+            "id": self.id,
+            "trigger": self.trigger,
+            "method": self.scope["method"],
+            "path": self.scope["path"],
+            "route": route_name(self.scope),
+            "status": self.status_code,
+            "started_at": self.started_at.isoformat(),
+            "wall_ms": round(1000 * wall, 3),
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "categories_ms": categories,
+            "stacks_ms": {stack: round(1000 * seconds, 3) for stack, seconds in self.stacks.items()},
+        }
+        if stats is not None:
+            # Measured by the engine hooks, not sampled
+            report["sql"] = {"queries": stats.queries, "rows": stats.rows, "db_ms": round(1000 * stats.db_seconds, 3)}
+        return report
+
+class Sampler:
+    """Samples the Python stacks of every thread while a request is profiled.
+
+    Samples are attributed to the profiled request running on that thread:
+    on the event loop thread through the frame of ProfilingMiddleware, on
+    worker threads through the context the work was submitted with. Each
+    sample weighs the time since the previous one, so a sampler delayed by
+    the GIL does not undercount.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sessions = set()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, session: ProfileSession):
+        with self._condition:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self, session: ProfileSession):
+        with self._condition:
+            self._sessions.discard(session)
+
+    def _work(self):
+        sampler_id = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            with self._condition:
+                while not self._sessions:
+                    self._condition.wait()
+                    last = time.perf_counter()
+                sessions = set(self._sessions)
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            try:
+                self._sample(sampler_id, sessions, weight)
+            except Exception:
+                # A bad tick must not end the thread; later profiles would be empty
+                logger.exception("Profile sampling failed")
+
+    def _sample(self, sampler_id: int, sessions: set, weight: float):
+        # One sample per request and tick; a thread that only waits for
+        # another thread of the same request gives way to that thread
+        picked = {}
+        frames = sys._current_frames()
+        try:
+            for thread_id, frame in frames.items():
+                if thread_id == sampler_id:
+                    continue
+                owner, codes = self._walk(frame)
+                if owner not in sessions:
+                    continue
+                waiting = any(module in codes[-1].co_filename for module in WAITING_MODULES) if codes else True
+                if owner not in picked or (picked[owner][0] and not waiting):
+                    picked[owner] = (waiting, codes)
+            for session, (_, codes) in picked.items():
+                session.add(codes, weight)
+        finally:
+            del frames
+
+    def _walk(self, frame):
+        """Returns the session owning a thread's stack and its frames, outermost first."""
+        codes = []
+        while frame is not None:
+            code = frame.f_code
+            if code is _MIDDLEWARE_CODE:
+                return frame.f_locals.get("session"), codes[::-1]
+            if "context" in code.co_varnames:
+                # anyio's WorkerThread.run and PasswordHasherPool._run
+                context = frame.f_locals.get("context")
+                if isinstance(context, Context):
+                    return context.get(current_profile), codes[::-1]
+            codes.append(code)
+            frame = frame.f_back
+        return None, codes
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+
+# ------------------ Report Store ------------------
+
+class ProfileStore:
+    """Keeps the latest `maxsize` reports as JSON files in a directory."""
+
+    def __init__(self, directory: str, maxsize: int):
+        self.directory = directory
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, report: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(report["id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(report, f)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+            if len(names) > self.maxsize:
+                paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+                for old in paths[: len(paths) - self.maxsize]:
+                    try:
+                        os.remove(old)
+                    except FileNotFoundError:
+                        pass
+
+    def load(self, profile_id: str) -> Optional[dict]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> List[dict]:
+        """Summaries of the stored reports, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in os.listdir(self.directory):
+            report = self.load(name[: -len(".json")]) if name.endswith(".json") else None
+            if report is not None:
+                report.pop("stacks_ms")
+                summaries.append(report)
+        return sorted(summaries, key=lambda report: report["started_at"], reverse=True)
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_STORE_MAX)
+
+def collapsed_stacks(report: dict) -> str:
+    """The stacks in the folded format of flamegraph.pl and speedscope, weighted in microseconds."""
+    return "".join(f"{stack} {round(1000 * ms)}\n" for stack, ms in report["stacks_ms"].items())
+
+# ------------------ Middleware ------------------
+
+def is_admin_request(scope, query) -> bool:
+    """Same gate as the admin endpoints: the SECRET_KEY query parameter or an admin's access token."""
+    if SECRET_KEY and query.get("secret_key", [None])[0] == SECRET_KEY:
+        return True
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                claims = decode_token(token, ACCESS_TOKEN_TYPE)
+            except HTTPException:
+                return False
+            return bool(claims.get("adm")) and bool(claims.get("act"))
+    return False
+
+def profile_requested(scope, query) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true", b"yes")
+    return query.get("profile", [""])[0].lower() in ("1", "true", "yes")
+
+class ProfilingMiddleware:
+    """Profiles a request on demand for admins, or every `sample_rate`-th request on average.
+
+    Admins opt in with an `X-Profile: 1` header or a `profile=1` query
+    parameter; the response then carries an `X-Profile-Id` header naming
+    the report under /admin/profiles. Flags from anybody else are ignored.
+    """
+
+    def __init__(self, app, sample_rate: int = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        session = None
+        if scope["type"] == "http":
+            trigger = self._trigger(scope)
+            if trigger is not None:
+                session = ProfileSession(scope, trigger)
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                session.status_code = message["status"]
+                if session.trigger == "admin":
+                    message = dict(message, headers=[*message.get("headers", []), (b"x-profile-id", session.id.encode())])
+            await send(message)
+
+        token = current_profile.set(session)
+        sampler.start(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop(session)
+            session.finished = time.perf_counter()
+            current_profile.reset(token)
+            report = session.report(current_request.get())
+            try:
+                await run_in_threadpool(profile_store.save, report)
+            except OSError:
+                logger.exception("Cannot store profile %s", session.id)
+
+    def _trigger(self, scope) -> Optional[str]:
+        if b"profile" in scope["query_string"] or any(name == b"x-profile" for name, _ in scope["headers"]):
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            if profile_requested(scope, query) and is_admin_request(scope, query):
+                return "admin"
+        if self.sample_rate > 0 and random.random() * self.sample_rate < 1:
+            return "sampled"
+        return None
+
+_MIDDLEWARE_CODE = ProfilingMiddleware.__call__.__code__
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Annotated
+
+from app.auth.jwt import get_current_active_user
+from app.auth.revocation import revocation_list
+from app.cache import place_cache
+from app.db.schemas import UserResponse
+from app.db.utils import password_hasher
+from app.mail import mail_queue
+from app.profiling import collapsed_stacks, profile_store
+from app.dependencies import SECRET_KEY
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    responses={404: {"description": "Not Found"}},
+)
+
+# ------------------ Runtime Stats ------------------
+
+@router.get("/stats")
+def read_stats(current_user: Annotated[UserResponse, Depends(get_current_active_user)], secret_key: str = None):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+
+    return {
+        "place_cache": place_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "revoked_token_entries": len(revocation_list),
+        "mail": mail_queue.stats(),
+    }
+
+# ------------------ Request Profiles ------------------
+
+@router.get("/profiles")
+def read_profiles(current_user: Annotated[UserResponse, Depends(get_current_active_user)], secret_key: str = None):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+def read_profile(profile_id: str, current_user: Annotated[UserResponse, Depends(get_current_active_user)], secret_key: str = None, format: str = "json"):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+
+    report = profile_store.load(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        # For flamegraph.pl or speedscope
+        return PlainTextResponse(collapsed_stacks(report))
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be one of: json, collapsed")
+    return report
@@ -0,0 +1,39 @@
+import hmac
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.auth.revocation import revocation_list
+from app.cache import place_cache
+from app.db.utils import password_hasher
+from app.dependencies import METRICS_TOKEN
+from app.mail import mail_queue
+from app.metrics import StatsCollector, registry
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The numbers of /admin/stats, read at scrape time
+registry.register(StatsCollector(
+    "place_cache", place_cache.stats, counters=("hits", "misses", "evictions", "invalidations"),
+))
+registry.register(StatsCollector(
+    "password_hashing", password_hasher.stats, counters=("completed",),
+))
+registry.register(StatsCollector(
+    "mail", mail_queue.stats, counters=("enqueued", "sent", "failed", "retried", "batches", "connections_opened"),
+))
+registry.register(StatsCollector(
+    "auth", lambda: {"revoked_token_entries": len(revocation_list)},
+))
+
+# ------------------ Prometheus Scrape ------------------
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics(authorization: Annotated[str, Header()] = ""):
+    if not METRICS_TOKEN or not hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
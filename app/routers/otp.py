@@ -4,10 +4,10 @@ import pyotp
 import time
 from fastapi import APIRouter, FastAPI, HTTPException, Depends
 from pydantic import BaseModel
-import smtplib
 
 from sqlalchemy.orm import Session
-from app.dependencies import SECRET_KEY, GMAIL_EMAIL, GMAIL_PASSWORD
+from app.dependencies import SECRET_KEY, GMAIL_EMAIL
+from app.mail import mail_queue
 from app.db.crud import create_otp, delete_otp_by_email, verify_otp_by_email
 from app.db.database import get_db
 from email_validator import validate_email, EmailNotValidError
@@ -21,7 +21,6 @@ router = APIRouter(
 )
 
 def send_email(subject, body, recipient):
-    password = GMAIL_PASSWORD
     sender = GMAIL_EMAIL
     # Create a multipart message
     msg = MIMEMultipart()
@@ -32,10 +31,9 @@ def send_email(subject, body, recipient):
 
     # Attach the message body
     msg.attach(MIMEText(message, 'plain'))
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp_server:
-       smtp_server.login(sender, password)
-       smtp_server.send_message(msg)
-    print("Message sent!")
+
+    # Delivered in the background over a pooled SMTP connection
+    mail_queue.send(msg)
     
 @router.post("/send-otp")
 def send_otp(email: str, db: Session = Depends(get_db)):
@@ -57,7 +55,7 @@ def send_otp(email: str, db: Session = Depends(get_db)):
         print(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save OTP: {e}")
     
-    # Kirim OTP ke email pengguna
+    # Kirim OTP ke email pengguna (antrian, tidak menunggu SMTP)
     subject = "Pulo-Aceh OTP Code"
     body = f"Your OTP is {otp}."
     recipient = email
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
 from sqlalchemy.orm import Session
 from typing import Annotated, List
 
 from app.auth.jwt import get_current_active_user
+from app.cache import PLACE_DETAIL_TAG, PLACE_LIST_TAG, get_or_load_place, place_tag
 from app.db.models import User
-from app.db.schemas import PlaceCreate, PlaceResponse, PlaceUpdate, RatingCreate, RatingResponse, UserResponse
-from app.db.crud import create_rating, get_place_by_id, get_places, create_place, get_ratings_by_place, get_ratings_by_user, update_place, delete_place, update_place_image
-from app.db.database import get_db
+from app.db.schemas import BulkItemResult, BulkResult, Page, PlaceBulkDelete, PlaceBulkUpdate, PlaceCreate, PlaceResponse, PlaceUpdate, RatingCreate, RatingResponse, RatingSummary, UserResponse
+from app.db.search import build_match_query
+from app.db.spatial import DISTANCE_FORMULAS
+from app.db.crud import PLACE_ORDERINGS, bulk_create_places, bulk_delete_places, bulk_update_places, create_rating, get_nearby_places, get_rating_summary, get_place_by_id, get_places, create_place, get_ratings_by_place, get_ratings_by_user, set_place_distances, update_place, delete_place, update_place_image
+from app.db.database import get_db, get_read_db
+from app.db.ratings import STARS, star_column
 from app.db.utils import get_full_image_url
-from app.dependencies import SECRET_KEY
-from geopy.distance import geodesic
+from app.dependencies import MAX_PAGE_SIZE, NEARBY_MAX_RADIUS_KM, PLACE_BULK_MAX_ITEMS, SECRET_KEY
+from app.media import get_variant_paths
+from app.serialization import RenderedJSONResponse, render_json
 
 router = APIRouter(
     prefix="/places",
@@ -17,23 +22,144 @@ router = APIRouter(
     responses={404: {"description": "Not Found"}},
 )
 
-def prepare_place_response(place: PlaceResponse):
+def set_place_image_urls(place: PlaceResponse) -> PlaceResponse:
     if place.image_url is not None:
+        variants = get_variant_paths(place.image_url)
+        if variants is not None:
+            place.image_variants = {name: get_full_image_url(path) for name, path in variants.items()}
         place.image_url = get_full_image_url(place.image_url)
     return place
 
-def prepare_places_response(places):
-    for place in places:
-        place = prepare_place_response(place)
-    return places
+def prepare_place_response(place) -> PlaceResponse:
+    # Work on a response copy so the ORM object never sees the absolute URLs
+    return set_place_image_urls(PlaceResponse.model_validate(place, from_attributes=True))
+
+def prepare_places_response(places) -> List[PlaceResponse]:
+    return [prepare_place_response(place) for place in places]
+
+def check_user_location(user_lat: float | None, user_lon: float | None, distance_formula: str):
+    """Returns (user_lat, user_lon), or None when the location is not given."""
+    if distance_formula not in DISTANCE_FORMULAS:
+        raise HTTPException(status_code=400, detail=f"distance_formula must be one of: {', '.join(DISTANCE_FORMULAS)}")
+    if user_lat is None or user_lon is None:
+        return None
+    if not -90 <= user_lat <= 90 or not -180 <= user_lon <= 180:
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    return user_lat, user_lon
 # ------------------ Get List of Places ------------------
 
-@router.get("/", response_model=List[PlaceResponse])
-def read_places(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), search: str = None, min_rating: float = None):
-    places = get_places(db=db, skip=skip, limit=limit, search=search, min_rating=min_rating)
-    
+@router.get("/", response_model=Page[PlaceResponse])
+def read_places(
+    cursor: str = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    search: str = None,
+    min_rating: float = None,
+    order_by: str = None,
+    user_lat: float | None = None,
+    user_lon: float | None = None,
+    distance_formula: str = "geodesic",
+):
+    if order_by is not None and order_by not in PLACE_ORDERINGS:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of: {', '.join(PLACE_ORDERINGS)}")
+    near = check_user_location(user_lat, user_lon, distance_formula)
+
+    def load_page():
+        places, next_cursor = get_places(
+            db=db, cursor=cursor, limit=limit, search=search, min_rating=min_rating, order_by=order_by,
+            near=near, distance_formula=distance_formula,
+        )
+        items = prepare_places_response(places)
+        # Cached pages are kept as JSON, so a hit skips validation and encoding
+        return render_json(Page[PlaceResponse](items=items, next_cursor=next_cursor))
+
+    if near is not None:
+        # Pages with distances depend on the user's location; not worth caching
+        return RenderedJSONResponse(load_page())
+    match_query = build_match_query(search) if search else None
+    cache_key = ("places", cursor, limit, match_query, min_rating, order_by)
+    return RenderedJSONResponse(get_or_load_place(db, cache_key, load_page, tags=[PLACE_LIST_TAG]))
+
+# ------------------ Get Nearby Places ------------------
+
+@router.get("/nearby", response_model=List[PlaceResponse])
+def read_nearby_places(
+    lat: float,
+    lon: float,
+    radius_km: float = Query(10.0, gt=0, le=NEARBY_MAX_RADIUS_KM),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+):
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+
+    places = get_nearby_places(db=db, lat=lat, lon=lon, radius_km=radius_km, limit=limit)
+
     return prepare_places_response(places)
 
+# ------------------ Bulk Place Writes ------------------
+# Declared before the /{place_id} routes so "bulk" is not read as an id
+
+def check_bulk_size(items: list):
+    if len(items) > PLACE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {PLACE_BULK_MAX_ITEMS} places per request")
+
+def bulk_result(items: List[BulkItemResult]) -> BulkResult:
+    failed = sum(1 for item in items if item.status >= 400)
+    return BulkResult(succeeded=len(items) - failed, failed=failed, items=items)
+
+@router.post("/bulk", response_model=BulkResult)
+def bulk_create_new_places(current_user: Annotated[UserResponse, Depends(get_current_active_user)], places: List[PlaceCreate], db: Session = Depends(get_db), secret_key: str = None):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+    check_bulk_size(places)
+
+    place_ids = bulk_create_places(db=db, places=places)
+
+    return bulk_result([
+        BulkItemResult(index=index, id=place_id, status=status.HTTP_201_CREATED)
+        for index, place_id in enumerate(place_ids)
+    ])
+
+@router.put("/bulk", response_model=BulkResult)
+def bulk_update_existing_places(current_user: Annotated[UserResponse, Depends(get_current_active_user)], places: List[PlaceBulkUpdate], db: Session = Depends(get_db), secret_key: str = None):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+    check_bulk_size(places)
+
+    results = [None] * len(places)
+    updates = []
+    for index, place in enumerate(places):
+        if place.image_url is not None:
+            results[index] = BulkItemResult(index=index, id=place.id, status=status.HTTP_400_BAD_REQUEST, detail="Image URL cannot be updated using this endpoint. Use /{place_id}/image instead.")
+        else:
+            updates.append(place)
+
+    existing_ids = bulk_update_places(db=db, places=updates)
+
+    for index, place in enumerate(places):
+        if results[index] is None:
+            if place.id in existing_ids:
+                results[index] = BulkItemResult(index=index, id=place.id, status=status.HTTP_200_OK)
+            else:
+                results[index] = BulkItemResult(index=index, id=place.id, status=status.HTTP_404_NOT_FOUND, detail="Place not found")
+    return bulk_result(results)
+
+@router.delete("/bulk", response_model=BulkResult)
+def bulk_delete_existing_places(current_user: Annotated[UserResponse, Depends(get_current_active_user)], payload: PlaceBulkDelete, db: Session = Depends(get_db), secret_key: str = None):
+    if secret_key != SECRET_KEY and current_user.is_admin == False:
+        raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
+    check_bulk_size(payload.ids)
+
+    existing_ids = bulk_delete_places(db=db, place_ids=payload.ids)
+
+    return bulk_result([
+        BulkItemResult(index=index, id=place_id, status=status.HTTP_200_OK)
+        if place_id in existing_ids else
+        BulkItemResult(index=index, id=place_id, status=status.HTTP_404_NOT_FOUND, detail="Place not found")
+        for index, place_id in enumerate(payload.ids)
+    ])
+
 # ------------------ Get Place by ID ------------------
 
 @router.get("/{place_id}", response_model=PlaceResponse)
@@ -41,26 +167,26 @@ def read_place(
     place_id: int,
     user_lat: float | None = None,
     user_lon: float | None = None,
-    db: Session = Depends(get_db),
+    distance_formula: str = "geodesic",
+    db: Session = Depends(get_read_db),
 ):
     # Ambil data tempat dari database
-    db_place = get_place_by_id(db=db, place_id=place_id)
-    if db_place is None:
+    def load_place():
+        db_place = get_place_by_id(db=db, place_id=place_id)
+        if db_place is None:
+            return None
+        return prepare_place_response(db_place)
+
+    place = get_or_load_place(db, ("place", place_id), load_place, tags=[PLACE_DETAIL_TAG, place_tag(place_id)])
+    if place is None:
         raise HTTPException(status_code=404, detail="Place not found")
-    
-    db_place = prepare_place_response(db_place)
+
     # Hitung jarak jika koordinat user diberikan
-    distance = None
-    if user_lat is not None and user_lon is not None:
-        place_location = (db_place.latitude, db_place.longitude)
-        user_location = (user_lat, user_lon)
-        distance = geodesic(place_location, user_location).kilometers
-
-    # Konversi objek SQLAlchemy ke dictionary
-    response = {column.name: getattr(db_place, column.name) for column in db_place.__table__.columns}
-    response['distance'] = distance
-    
-    return response
+    near = check_user_location(user_lat, user_lon, distance_formula)
+    if near is not None:
+        place = set_place_distances([place.model_copy()], *near, formula=distance_formula)[0]
+
+    return place
 
 # ------------------ Create New Place ------------------
 
@@ -138,6 +264,20 @@ def rate_place(place_id: int, rating: RatingCreate, current_user: User = Depends
     create_rating(db=db, user_id=current_user.id, place_id=place_id, rating=rating)
     return {"detail": "Rating created successfully"}
     
-@router.get("/{place_id}/ratings", response_model=List[RatingResponse])
-def get_place_ratings(place_id: int, db: Session = Depends(get_db)):
-    return get_ratings_by_place(db=db, place_id=place_id)
+@router.get("/{place_id}/ratings", response_model=Page[RatingResponse])
+def get_place_ratings(place_id: int, cursor: str = None, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_read_db)):
+    ratings, next_cursor = get_ratings_by_place(db=db, place_id=place_id, cursor=cursor, limit=limit)
+    return Page(items=ratings, next_cursor=next_cursor)
+
+@router.get("/{place_id}/ratings/summary", response_model=RatingSummary)
+def get_place_rating_summary(place_id: int, db: Session = Depends(get_read_db)):
+    summary = get_rating_summary(db=db, place_id=place_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return RatingSummary(
+        place_id=summary.id,
+        count=summary.rating_count,
+        average=summary.average_rating or 0.0,
+        stars={bucket: getattr(summary, star_column(bucket)) for bucket in STARS},
+        with_message=summary.message_count,
+    )
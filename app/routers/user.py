@@ -1,16 +1,20 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, status, File, UploadFile
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Annotated, List
 
-from app.auth.jwt import ACCESS_TOKEN_EXPIRE_MINUTES, Token, create_access_token, get_current_active_user
+from app.auth.jwt import REFRESH_TOKEN_TYPE, RefreshTokenRequest, Token, create_token_pair, decode_token, get_current_active_user, revoke_refresh_token
 from app.db.utils import get_full_image_url
 from app.routers.otp import send_otp
-from app.db.schemas import RatingResponse, UserCreate, UserResponse, UserUpdate, UserUpdateProfile
-from app.db.crud import authenticate_user, get_ratings_by_user, get_user_by_id, get_user_by_email, get_users, create_user, unsave_place_from_user, update_user, delete_user, save_place_to_user, update_user_photo, verify_otp_by_email
-from app.db.database import get_db
-from app.dependencies import SECRET_KEY
+from app.routers.place import bulk_result, check_bulk_size, prepare_places_response, set_place_image_urls
+from app.db.schemas import BulkItemResult, BulkResult, Page, PlaceResponse, RatingResponse, SavedPlacesBulk, UserCreate, UserProfileResponse, UserResponse, UserUpdate, UserUpdateProfile
+from app.db import async_crud
+from app.db.crud import get_ratings_by_user, get_saved_places, get_user_by_email, get_user_with_saved_places, get_users, create_user, save_places_to_user, unsave_place_from_user, unsave_places_from_user, update_user, delete_user, save_place_to_user, verify_otp_by_email
+from app.db.database import get_async_db, get_db, get_read_db
+from app.dependencies import MAX_PAGE_SIZE, SECRET_KEY
+from app.media import get_variant_paths
 
 
 router = APIRouter(
@@ -19,28 +23,30 @@ router = APIRouter(
     responses={404: {"description": "Not Found"}}
 )
 
-def prepare_user_response(user: UserResponse):
-    if user.photo_url is not None:
-        user.photo_url = get_full_image_url(user.photo_url)
+def prepare_user_response(user, schema=UserResponse) -> UserProfileResponse:
+    # Work on a response copy so the ORM object never sees the absolute URLs
+    response = schema.model_validate(user, from_attributes=True)
+    if response.photo_url is not None:
+        variants = get_variant_paths(response.photo_url)
+        if variants is not None:
+            response.photo_variants = {name: get_full_image_url(path) for name, path in variants.items()}
+        response.photo_url = get_full_image_url(response.photo_url)
     
-    if user.saved_places is not None:
-        for place in user.saved_places:
-            place.image_url = get_full_image_url(place.image_url)
-    return user
+    for place in getattr(response, "saved_places", None) or []:
+        set_place_image_urls(place)
+    return response
 
-def prepare_users_response(users):
-    for user in users:
-        user = prepare_user_response(user)
-    return users
+def prepare_users_response(users) -> List[UserResponse]:
+    return [prepare_user_response(user) for user in users]
 # ------------------ Get List of Users ------------------
 
-@router.get("/", response_model=List[UserResponse])
-def read_users(current_user: Annotated[UserResponse, Depends(get_current_active_user)], skip: int = 0, limit: int = 10, db: Session = Depends(get_db), secret_key: str = None):
+@router.get("/", response_model=Page[UserResponse])
+def read_users(current_user: Annotated[UserResponse, Depends(get_current_active_user)], cursor: str = None, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db), secret_key: str = None):
     if secret_key != SECRET_KEY and current_user.is_admin == False:
         raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
         
-    users = get_users(db=db, skip=skip, limit=limit)
-    return prepare_users_response(users)
+    users, next_cursor = get_users(db=db, cursor=cursor, limit=limit)
+    return Page(items=prepare_users_response(users), next_cursor=next_cursor)
 
 # ------------------ Get User by ID ------------------
 
@@ -49,7 +55,7 @@ def read_user(current_user: Annotated[UserResponse, Depends(get_current_active_u
     if secret_key != SECRET_KEY and current_user.is_admin == False:
         raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
     
-    db_user = get_user_by_id(db=db, user_id=user_id)
+    db_user = get_user_with_saved_places(db=db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -114,62 +120,83 @@ def change_password_with_otp(email: str, new_password: str, otp: str, db: Sessio
 @router.post("/auth/login", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Token:
-    user = authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await async_crud.authenticate_user(db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return Token(access_token=access_token, token_type="bearer")
+    return create_token_pair(user)
 
 
 # ------------------ Refresh Token ------------------
-# @router.post("/auth/refresh-token", response_model=Token)
-# async def refresh_token(current_user: Annotated[UserResponse, Depends(get_current_active_user)], db: Session = Depends(get_db)) -> Token:
-#     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-#     access_token = create_access_token(
-#         data={"sub": current_user.email}, expires_delta=access_token_expires
-#     )
-#     return Token(access_token=access_token, token_type="bearer")
+@router.post("/auth/refresh-token", response_model=Token)
+async def refresh_token(body: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)) -> Token:
+    payload = decode_token(body.refresh_token, REFRESH_TOKEN_TYPE)
+    # Refresh tokens are single use; claim this one before any await, so of
+    # concurrent requests with the same token only the first gets through
+    if not revoke_refresh_token(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Reload the user so the new access token carries current claims
+    user = await async_crud.get_user_by_id(db, payload["uid"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return create_token_pair(user)
 
 # ------------------ Get User Profile ------------------
-@router.get("/auth/me", response_model=UserResponse)
+@router.get("/auth/me", response_model=UserProfileResponse)
 async def get_current_user(
     current_user: Annotated[UserResponse, Depends(get_current_active_user)],
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # Saved places are paginated separately at /auth/me/saved
+    user = await async_crud.get_user_by_id(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    return prepare_user_response(current_user)
+    return prepare_user_response(user, UserProfileResponse)
+
+# ------------------ Get Saved Places ------------------
+@router.get("/auth/me/saved", response_model=Page[PlaceResponse])
+def read_saved_places(current_user: Annotated[UserResponse, Depends(get_current_active_user)], cursor: str = None, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    places, next_cursor = get_saved_places(db=db, user_id=current_user.id, cursor=cursor, limit=limit)
+    return Page(items=prepare_places_response(places), next_cursor=next_cursor)
 
 # ------------------ Update User Profile Photo ------------------
 
-@router.put("/auth/me/photo", response_model=UserResponse)
+@router.put("/auth/me/photo", response_model=UserProfileResponse)
 async def update_profile_photo(
     photo: Annotated[UploadFile, File(description="A File containing an image")],
     current_user: Annotated[UserResponse, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     # Assuming you have a function to handle photo update
-    updated_user = update_user_photo(db=db, user_id=current_user.id, photo=photo)
+    updated_user = await async_crud.update_user_photo(db=db, user_id=current_user.id, photo=photo)
     
-    return prepare_user_response(updated_user)
+    return prepare_user_response(updated_user, UserProfileResponse)
 
 # ------------------ Update User ------------------
 
-@router.put("/auth/me", response_model=UserResponse)
+@router.put("/auth/me", response_model=UserProfileResponse)
 def update_current_user(user: UserUpdateProfile, current_user: Annotated[UserResponse, Depends(get_current_active_user)], db: Session = Depends(get_db), secret_key: str = None):
     if user.is_admin:
         if secret_key != SECRET_KEY:
             raise HTTPException(status_code=403, detail="Invalid secret key for admin editing")
     
-    return update_user(db=db, user_id=current_user.id, user=user)
+    return prepare_user_response(update_user(db=db, user_id=current_user.id, user=user), UserProfileResponse)
 
 
 # ------------------ change me email with otp ------------------
@@ -193,11 +220,44 @@ def delete_existing_user(current_user: Annotated[UserResponse, Depends(get_curre
     if secret_key != SECRET_KEY and current_user.is_admin == False:
         raise HTTPException(status_code=403, detail="Invalid secret key for admin registration and unauthorized user")
     
-    db_user = get_user_by_id(db=db, user_id=user_id)
+    db_user = get_user_with_saved_places(db=db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return delete_user(db=db, user_id=user_id)
+    # The response is built before the row and its relations go away
+    deleted_user = prepare_user_response(db_user)
+    delete_user(db=db, user_id=user_id)
+    return deleted_user
+
+# ------------------ Bulk Save / Unsave Places ------------------
+# Declared before /save/{place_id} so "bulk" is not read as an id
+
+@router.post("/save/bulk", response_model=BulkResult)
+def save_places_to_current_user(payload: SavedPlacesBulk, current_user: Annotated[UserResponse, Depends(get_current_active_user)], db: Session = Depends(get_db)):
+    check_bulk_size(payload.place_ids)
+    new_ids, existing_ids = save_places_to_user(db=db, user_id=current_user.id, place_ids=payload.place_ids)
+
+    items = []
+    for index, place_id in enumerate(payload.place_ids):
+        if place_id in new_ids:
+            items.append(BulkItemResult(index=index, id=place_id, status=status.HTTP_201_CREATED))
+        elif place_id in existing_ids:
+            items.append(BulkItemResult(index=index, id=place_id, status=status.HTTP_200_OK, detail="Place already saved to user's list."))
+        else:
+            items.append(BulkItemResult(index=index, id=place_id, status=status.HTTP_404_NOT_FOUND, detail="Place not found"))
+    return bulk_result(items)
+
+@router.delete("/unsave/bulk", response_model=BulkResult)
+def unsave_places_from_current_user(payload: SavedPlacesBulk, current_user: Annotated[UserResponse, Depends(get_current_active_user)], db: Session = Depends(get_db)):
+    check_bulk_size(payload.place_ids)
+    removed_ids = unsave_places_from_user(db=db, user_id=current_user.id, place_ids=payload.place_ids)
+
+    return bulk_result([
+        BulkItemResult(index=index, id=place_id, status=status.HTTP_200_OK)
+        if place_id in removed_ids else
+        BulkItemResult(index=index, id=place_id, status=status.HTTP_404_NOT_FOUND, detail="Place not found in user's saved list.")
+        for index, place_id in enumerate(payload.place_ids)
+    ])
 
 # ------------------ Save Place to User ------------------
 
@@ -222,6 +282,7 @@ def unsave_place_from_current_user(place_id: int, current_user: Annotated[UserRe
     return {"message": "Place removed from user's list successfully"}
 
 # ------------------ Get User Ratings ------------------
-@router.get("/{user_id}/ratings", response_model=List[RatingResponse])
-def get_user_ratings(user_id: int, current_user: Annotated[UserResponse, Depends(get_current_active_user)], db: Session = Depends(get_db)):
-    return get_ratings_by_user(db=db, user_id=current_user.id)
\ No newline at end of file
+@router.get("/{user_id}/ratings", response_model=Page[RatingResponse])
+def get_user_ratings(user_id: int, current_user: Annotated[UserResponse, Depends(get_current_active_user)], cursor: str = None, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_read_db)):
+    ratings, next_cursor = get_ratings_by_user(db=db, user_id=current_user.id, cursor=cursor, limit=limit)
+    return Page(items=ratings, next_cursor=next_cursor)
\ No newline at end of file
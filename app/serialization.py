@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi import Response
+from pydantic_core import to_json
+
+def render_json(value: Any) -> bytes:
+    """Serializes Pydantic models (or plain data) straight to JSON bytes with pydantic-core's Rust encoder."""
+    return to_json(value)
+
+class RenderedJSONResponse(Response):
+    """Sends JSON bytes produced by render_json, e.g. a cached page, without validating or encoding them again."""
+    media_type = "application/json"
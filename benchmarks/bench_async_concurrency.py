@@ -0,0 +1,68 @@
+"""Request throughput of authenticated async endpoints at growing concurrency.
+
+Runs the app in-process on a single event loop (one worker) against a fresh
+SQLite database in a temporary directory, and fires GET /users/auth/me with
+N concurrent clients. With the async database stack, throughput should grow
+with concurrency instead of staying flat behind blocking DB calls.
+
+    python benchmarks/bench_async_concurrency.py --requests 2000 --concurrency 1 8 32 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def run_level(client, headers, total: int, concurrency: int) -> float:
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            response = await client.get("/users/auth/me", headers=headers)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+async def main(args):
+    import httpx
+    from app.main import app
+    from app.db import crud, migrations, schemas
+    from app.db.database import SessionLocal, engine
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(name="Bench", email="bench@example.com", password="bench-password"))
+    crud.update_user(db, user.id, schemas.UserUpdate(is_active=True))
+    db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/users/auth/login", data={"username": "bench@example.com", "password": "bench-password"})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        await run_level(client, headers, min(args.requests, 100), 4)  # warm up
+        print(f"{'concurrency':>12} {'req/s':>10}")
+        for concurrency in args.concurrency:
+            rps = await run_level(client, headers, args.requests, concurrency)
+            print(f"{concurrency:>12} {rps:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-bench-")
+    os.makedirs(os.path.join(workdir, "static"))
+    os.chdir(workdir)
+    asyncio.run(main(args))
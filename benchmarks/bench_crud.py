@@ -0,0 +1,184 @@
+"""Times app/db/crud.py functions at growing data set sizes.
+
+For each scale the data set of generate_dataset.py is generated into a fresh
+database (places, users and ratings all grow by the scale factor) and every
+case below is timed in a subprocess (median of --repeat calls, each in a new
+session). The last column is the growth exponent of the time against the data
+set size between the smallest and the largest scale: about 0 means the call
+does not depend on the data set size (index lookups, keyset pages), about 1
+means it is linear in it.
+
+There is no update_average_rating: create_rating maintains the rating
+aggregates incrementally, and rebuild_rating_aggregates recomputes them.
+
+    python benchmarks/bench_crud.py --base 1000:10000:100000 --scales 1 4 16
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------ Cases ------------------
+
+def case_list(ctx):
+    from app.db import crud
+    from app.db.schemas import PlaceCreate, PlaceUpdate, RatingCreate
+
+    popular, active = ctx["popular_place"], ctx["active_user"]
+    names = iter(range(10 ** 9))
+    return {
+        "get_places (id)": lambda db: crud.get_places(db, limit=20),
+        "get_places (next page)": lambda db: crud.get_places(db, cursor=ctx["places_cursor"], limit=20),
+        "get_places (rating>=4)": lambda db: crud.get_places(db, limit=20, min_rating=4, order_by="rating"),
+        "get_places (search)": lambda db: crud.get_places(db, limit=20, search="pantai"),
+        "get_place_by_id": lambda db: crud.get_place_by_id(db, popular),
+        "get_places (by distance)": lambda db: crud.get_places(db, limit=20, order_by="distance", near=(5.70, 95.06)),
+        "get_nearby_places": lambda db: crud.get_nearby_places(db, 5.70, 95.06, radius_km=5, limit=20),
+        "get_ratings_by_place": lambda db: crud.get_ratings_by_place(db, popular, limit=20),
+        "get_ratings_by_user": lambda db: crud.get_ratings_by_user(db, active, limit=20),
+        "get_rating_summary": lambda db: crud.get_rating_summary(db, popular),
+        "get_saved_places": lambda db: crud.get_saved_places(db, ctx["saver"], limit=20),
+        "get_user_by_email": lambda db: crud.get_user_by_email(db, ctx["email"]),
+        "get_users": lambda db: crud.get_users(db, limit=20),
+        "create_rating": lambda db: crud.create_rating(db, active, popular, RatingCreate(rating=4, message="Bagus")),
+        "save + unsave place": lambda db: (
+            crud.save_place_to_user(db, active, ctx["unsaved_place"]),
+            crud.unsave_place_from_user(db, active, ctx["unsaved_place"]),
+        ),
+        "create_place": lambda db: crud.create_place(db, PlaceCreate(name="Pantai Baru", latitude=5.7, longitude=95.06)),
+        "update_place": lambda db: crud.update_place(db, popular, PlaceUpdate(name=f"Pantai {next(names)}")),
+        "rebuild_rating_aggregates (1)": lambda db: crud.rebuild_rating_aggregates(db, place_id=popular),
+    }
+
+def context():
+    from sqlalchemy import func, select
+
+    from app.db import crud, models
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        popular = db.scalar(select(models.Place.id).order_by(models.Place.rating_count.desc()).limit(1))
+        active = db.scalar(
+            select(models.Rating.user_id).group_by(models.Rating.user_id).order_by(func.count().desc()).limit(1)
+        )
+        association = models.user_place_association
+        saver = db.scalar(
+            select(association.c.user_id).group_by(association.c.user_id).order_by(func.count().desc()).limit(1)
+        )
+        saved = set(db.scalars(select(association.c.place_id).where(association.c.user_id == active)))
+        unsaved_place = next(place_id for place_id in db.scalars(select(models.Place.id)) if place_id not in saved)
+        _, places_cursor = crud.get_places(db, limit=20)
+        email = db.scalar(select(models.User.email).where(models.User.id == active))
+    finally:
+        db.close()
+    return {
+        "popular_place": popular,
+        "active_user": active,
+        "saver": saver,
+        "unsaved_place": unsaved_place,
+        "places_cursor": places_cursor,
+        "email": email,
+    }
+
+def worker(args):
+    from generate_dataset import generate
+    from app.db.database import SessionLocal
+
+    places, users, ratings = args.size
+    generate(places, users, ratings, seed=args.seed)
+    ctx = context()
+    results = {}
+    for name, fn in case_list(ctx).items():
+        samples = []
+        for _ in range(args.repeat):
+            db = SessionLocal()
+            try:
+                started = time.perf_counter()
+                fn(db)
+                samples.append(1000 * (time.perf_counter() - started))
+            finally:
+                db.close()
+        results[name] = statistics.median(samples)
+    print(json.dumps(results))
+
+# ------------------ Driver ------------------
+
+def run_scale(size, args):
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-bench-")
+    os.makedirs(os.path.join(workdir, "static"))
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([ROOT, BENCHMARKS]),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        PLACE_CACHE_ENABLED="false",
+    )
+    env.setdefault("SECRET_KEY", "bench-secret")
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--size", ":".join(map(str, size)), "--repeat", str(args.repeat), "--seed", str(args.seed),
+    ]
+    output = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True, check=True).stdout
+    lines = output.strip().splitlines()
+    for line in lines[:-1]:
+        print(f"  {line}")
+    return json.loads(lines[-1])
+
+def trend(exponent: float) -> str:
+    if exponent < 0.15:
+        return "flat"
+    if exponent < 0.7:
+        return "sublinear"
+    if exponent < 1.3:
+        return "linear"
+    return "superlinear"
+
+def main(args):
+    sizes = [tuple(count * scale for count in args.base) for scale in args.scales]
+    results = []
+    for size in sizes:
+        print(f"Generating {size[0]:,} places, {size[1]:,} users, {size[2]:,} ratings")
+        results.append(run_scale(size, args))
+
+    print()
+    header = " ".join(f"{'x' + str(scale) + ' ms':>10}" for scale in args.scales)
+    print(f"{'case':<32} {header} {'exponent':>9}  trend")
+    growth = math.log(args.scales[-1] / args.scales[0]) if len(args.scales) > 1 else 0
+    for name in results[0]:
+        timings = [result[name] for result in results]
+        row = f"{name:<32} " + " ".join(f"{ms:>10.3f}" for ms in timings)
+        if growth:
+            exponent = math.log(timings[-1] / timings[0]) / growth
+            row += f" {exponent:>9.2f}  {trend(exponent)}"
+        print(row)
+
+def parse_size(value: str):
+    try:
+        places, users, ratings = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected <places>:<users>:<ratings>")
+    return places, users, ratings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", type=parse_size, default=(1000, 10000, 100000), help="<places>:<users>:<ratings> at scale 1")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=25, help="Calls per case; the median is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=parse_size, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    if args.worker:
+        worker(args)
+    else:
+        main(args)
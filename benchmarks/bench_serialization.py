@@ -0,0 +1,121 @@
+"""Serialization time and bytes on the wire for GET /places/?limit=100.
+
+Seeds a throwaway SQLite database with places carrying long free-text
+descriptions, then reports:
+
+- the time to encode one 100-place page with FastAPI's generic encoder
+  (jsonable_encoder + json.dumps) versus pydantic-core's Rust encoder used by
+  render_json;
+- the response size and request latency for identity, gzip and brotli
+  encodings, for a cache miss and a cache hit.
+
+    python benchmarks/bench_serialization.py --places 500 --iterations 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(count: int):
+    from faker import Faker
+    from app.db import crud, schemas
+    from app.db.database import SessionLocal
+
+    fake = Faker("id_ID")
+    Faker.seed(0)
+    db = SessionLocal()
+    for _ in range(count):
+        crud.create_place(db, schemas.PlaceCreate(
+            name=fake.street_name(),
+            description=fake.text(max_nb_chars=1500),
+            location_name=fake.city(),
+            latitude=round(fake.pyfloat(min_value=5.5, max_value=5.9), 7),
+            longitude=round(fake.pyfloat(min_value=95.0, max_value=95.4), 7),
+            image_url=f"static/photos/{fake.sha256()}.jpg",
+        ))
+    db.close()
+
+def time_ms(fn, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def bench_encoders(iterations: int):
+    from fastapi.encoders import jsonable_encoder
+    from app.db.crud import get_places
+    from app.db.database import SessionLocal
+    from app.db.schemas import Page, PlaceResponse
+    from app.routers.place import prepare_places_response
+    from app.serialization import render_json
+
+    db = SessionLocal()
+    places, next_cursor = get_places(db=db, limit=100)
+    page = Page[PlaceResponse](
+        items=[PlaceResponse.model_validate(place, from_attributes=True) for place in prepare_places_response(places)],
+        next_cursor=next_cursor,
+    )
+    db.close()
+
+    generic = time_ms(lambda: json.dumps(jsonable_encoder(page)).encode(), iterations)
+    rust = time_ms(lambda: render_json(page), iterations)
+    print(f"{'encoder':<28} {'median ms':>10}")
+    print(f"{'jsonable_encoder + json':<28} {generic:>10.3f}")
+    print(f"{'render_json (pydantic-core)':<28} {rust:>10.3f}")
+    print()
+
+def bench_wire(iterations: int):
+    from fastapi.testclient import TestClient
+    from app.cache import place_cache
+    from app.main import app
+
+    client = TestClient(app)
+    print(f"{'encoding':<10} {'bytes':>9} {'miss ms':>9} {'hit ms':>9}")
+    for encoding in ("identity", "gzip", "br"):
+        headers = {"Accept-Encoding": encoding}
+
+        def miss():
+            place_cache.clear()
+            return client.get("/places/?limit=100", headers=headers)
+
+        def hit():
+            return client.get("/places/?limit=100", headers=headers)
+
+        response = miss()
+        response.raise_for_status()
+        served = response.headers.get("content-encoding", "identity")
+        if served != encoding:
+            print(f"{encoding:<10} {'not negotiated (served ' + served + ')':>29}")
+            continue
+        size = response.num_bytes_downloaded
+        miss_ms = time_ms(miss, iterations)
+        hit()
+        hit_ms = time_ms(hit, iterations)
+        print(f"{encoding:<10} {size:>9} {miss_ms:>9.2f} {hit_ms:>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-bench-")
+    os.makedirs(os.path.join(workdir, "static"))
+    os.chdir(workdir)
+
+    from app.db import migrations
+    from app.db.database import engine
+
+    migrations.upgrade(engine)
+    seed(args.places)
+    bench_encoders(args.iterations)
+    bench_wire(args.iterations)
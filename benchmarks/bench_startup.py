@@ -0,0 +1,105 @@
+"""Startup cost of the API: import time and time to first response.
+
+Each run starts a fresh interpreter against a migrated SQLite database in a
+temporary directory. Import time is `import app.main` alone; time to first
+response runs uvicorn with the create_app factory and polls GET /places/
+until it answers. Also lists the slowest top-level packages from
+`python -X importtime`. With --max-import-ms or --max-first-response-ms the
+script exits non-zero when the median is above the limit.
+
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 1500
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def run_python(args, env, workdir, **kwargs):
+    return subprocess.run([sys.executable, *args], env=env, cwd=workdir, capture_output=True, text=True, check=True, **kwargs)
+
+def import_ms(env, workdir) -> float:
+    return 1000 * float(run_python(["-c", IMPORT_SCRIPT], env, workdir).stdout)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def first_response_ms(env, workdir, timeout: float = 60.0) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/places/?limit=1"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:create_app", "--factory", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=workdir,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url) as response:
+                    if response.status == 200:
+                        return 1000 * (time.perf_counter() - started)
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError(f"No response from {url} within {timeout} s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def slowest_packages(env, workdir, count: int):
+    # Cumulative time of each top-level package, where it is first imported
+    stderr = run_python(["-X", "importtime", "-c", "import app.main"], env, workdir).stderr
+    packages = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and "." not in match.group(4):
+            name = match.group(4)
+            packages[name] = max(packages.get(name, 0), int(match.group(2)))
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:count]
+
+def main(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-bench-")
+    os.makedirs(os.path.join(workdir, "static"))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.setdefault("SECRET_KEY", "bench-secret")
+    run_python(["-m", "app.cli", "migrate"], env, workdir)
+
+    imports = [import_ms(env, workdir) for _ in range(args.runs)]
+    responses = [first_response_ms(env, workdir) for _ in range(args.runs)]
+
+    print(f"{'measure':<22} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    failures = 0
+    for name, samples, limit in (
+        ("import app.main", imports, args.max_import_ms),
+        ("first response", responses, args.max_first_response_ms),
+    ):
+        median = statistics.median(samples)
+        over = limit is not None and median > limit
+        failures += over
+        print(f"{name:<22} {median:>10.1f} {min(samples):>8.1f} {max(samples):>8.1f}" + (f"  FAIL (limit {limit:g})" if over else ""))
+
+    print()
+    print(f"{'package':<22} {'import ms':>10}")
+    for name, microseconds in slowest_packages(env, workdir, args.top):
+        print(f"{name:<22} {microseconds / 1000:>10.1f}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level packages to list")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-response-ms", type=float, default=None)
+    sys.exit(main(parser.parse_args()))
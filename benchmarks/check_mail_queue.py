@@ -0,0 +1,165 @@
+"""Checks MailQueue delivery, retries and shutdown against a stub SMTP server.
+
+Starts a minimal SMTP server on localhost that records every message and
+can answer DATA with a transient 451. Checks that queued mail is
+delivered in batches over one connection, that a 451 gets exactly one
+retry, and that stop() neither loses mail waiting for a retry nor drops
+it silently: every message ends up sent or counted as failed. Exits
+non-zero on any failure.
+
+    python benchmarks/check_mail_queue.py
+"""
+import os
+import socketserver
+import sys
+import threading
+import time
+from email.message import EmailMessage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.received = []
+        self.connections = 0
+        # DATA answers 451 while this is positive, or always when None
+        self.tempfail = 0
+
+    def should_tempfail(self) -> bool:
+        with self.lock:
+            if self.tempfail is None:
+                return True
+            if self.tempfail > 0:
+                self.tempfail -= 1
+                return True
+            return False
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250 stub")
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (data := self.rfile.readline()) not in (b".\r\n", b""):
+                    lines.append(data)
+                if self.server.should_tempfail():
+                    self.reply("451 Try again later")
+                    continue
+                subject = next(
+                    (data.decode().split(":", 1)[1].strip() for data in lines if data.lower().startswith(b"subject:")), None
+                )
+                with self.server.lock:
+                    self.server.received.append(subject)
+                self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+def make_message(subject: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "check@example.com"
+    message["To"] = "user@example.com"
+    message["Subject"] = subject
+    message.set_content("check")
+    return message
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+def main() -> int:
+    from app.mail import MailQueue
+
+    results = []
+
+    def check(name: str, ok: bool, detail: str = ""):
+        results.append(ok)
+        print(f"{name:<58} {'ok' if ok else 'FAIL'} {detail}")
+
+    server = StubSMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    def new_queue(**options) -> MailQueue:
+        return MailQueue(host, port, use_ssl=False, workers=1, timeout=5.0, **options)
+
+    # Delivery in batches over one kept-open connection
+    mail = new_queue(batch_size=5)
+    subjects = [f"batch-{number}" for number in range(12)]
+    for subject in subjects:
+        mail.send(make_message(subject))
+    delivered = wait_for(lambda: mail.stats()["sent"] == len(subjects))
+    stats = mail.stats()
+    mail.stop()
+    check("queued mail is delivered", delivered and sorted(server.received) == sorted(subjects), f"sent={stats['sent']}")
+    check("one connection serves every message", stats["connections_opened"] == 1, f"opened={stats['connections_opened']}")
+    check("messages go out in batches", 1 < stats["batches"] < len(subjects), f"batches={stats['batches']}")
+
+    # A transient 4xx is retried once, after the backoff
+    server.received.clear()
+    server.tempfail = 1
+    mail = new_queue(backoff_seconds=0.2)
+    mail.send(make_message("retry"))
+    delivered = wait_for(lambda: mail.stats()["sent"] == 1)
+    stats = mail.stats()
+    mail.stop()
+    check("a 451 is retried and then delivered", delivered and server.received == ["retry"])
+    check("exactly one retry, no failure", stats["retried"] == 1 and stats["failed"] == 0, f"retried={stats['retried']} failed={stats['failed']}")
+
+    # stop() gives a message waiting for its retry one last attempt
+    server.received.clear()
+    server.tempfail = 1
+    mail = new_queue(backoff_seconds=60)
+    mail.send(make_message("pending"))
+    waiting = wait_for(lambda: mail.stats()["pending_retries"] == 1)
+    mail.stop()
+    stats = mail.stats()
+    check("stop() delivers mail waiting for a retry", waiting and server.received == ["pending"], f"sent={stats['sent']}")
+
+    # When that last attempt fails too, the message is counted as failed
+    server.received.clear()
+    server.tempfail = None
+    mail = new_queue(backoff_seconds=60)
+    for number in range(3):
+        mail.send(make_message(f"lost-{number}"))
+    waiting = wait_for(lambda: mail.stats()["pending_retries"] == 3)
+    mail.stop()
+    stats = mail.stats()
+    check(
+        "stop() accounts for every message",
+        waiting and stats["sent"] + stats["failed"] == stats["enqueued"] == 3 and stats["failed"] == 3,
+        f"enqueued={stats['enqueued']} sent={stats['sent']} failed={stats['failed']}",
+    )
+
+    server.shutdown()
+    return 0 if all(results) else 1
+
+if __name__ == "__main__":
+    os.environ.setdefault("SECRET_KEY", "check-secret")
+    sys.path.insert(0, ROOT)
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Asserts that read endpoints issue a fixed number of SQL statements.
+
+Seeds a throwaway database with users who saved several places and rated
+them, then calls each endpoint at growing page sizes and counts the
+statements sent to SQLite (sync and async engines). A count that grows with
+the page size is an N+1 lazy load; a count that differs from EXPECTED is a
+regression. Exits non-zero on any mismatch.
+
+    python benchmarks/check_query_counts.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_SIZES = (1, 10, 50)
+
+# Statements per request. Token-authenticated endpoints need no user lookup.
+EXPECTED = {
+    "GET /users/": 2,  # page of users + saved places (selectin)
+    "GET /users/{id}": 2,  # user + saved places (selectin)
+    "GET /users/auth/me": 1,
+    "GET /users/auth/me/saved": 1,
+    "GET /users/{id}/ratings": 1,
+    "GET /places/": 1,
+    "GET /places/?search": 1,
+    # R*Tree ring + places by id; the seeded places all fall inside the first
+    # ring, since more rings (one query each) are only searched in sparse areas
+    "GET /places/nearby": 2,
+    "GET /places/{id}": 1,
+    "GET /places/{id}/ratings": 1,
+    "GET /places/{id}/ratings/summary": 1,
+}
+
+class QueryCounter:
+    def __init__(self, *engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def seed(places: int, users: int, saved_per_user: int):
+    from app.db import crud, migrations, models, schemas
+    from app.db.database import SessionLocal, engine
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    place_ids = crud.bulk_create_places(db, [
+        schemas.PlaceCreate(
+            name=f"Pantai {number}",
+            description=f"Pantai berpasir putih nomor {number}",
+            location_name="Pulo Aceh",
+            latitude=round(5.6 + number * 0.0001, 6),
+            longitude=95.1,
+            image_url=f"static/photos/{number:064x}.jpg",
+        )
+        for number in range(places)
+    ])
+    for number in range(users):
+        user = crud.create_user(db, schemas.UserCreate(
+            name=f"User {number}", email=f"user{number}@example.com", password="check-password", is_admin=number == 0,
+        ))
+        crud.update_user(db, user.id, schemas.UserUpdate(is_active=True))
+        db_user = db.get(models.User, user.id)
+        db_user.photo_url = f"static/photos/{number + places:064x}.jpg"
+        for place_id in place_ids[number:number + saved_per_user]:
+            db_user.saved_places.append(db.get(models.Place, place_id))
+            db.add(models.Rating(user_id=user.id, place_id=place_id, rating=4, message="Bagus"))
+        db.commit()
+    db.close()
+    return place_ids
+
+def main(args) -> int:
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.db.database import async_engine, engine, read_engine
+
+    place_ids = seed(places=max(PAGE_SIZES) * 2, users=max(PAGE_SIZES) + 1, saved_per_user=args.saved_per_user)
+    client = TestClient(app)
+    login = client.post("/users/auth/login", data={"username": "user0@example.com", "password": "check-password"})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    place_id = place_ids[0]
+
+    requests = {
+        "GET /users/": lambda size: f"/users/?limit={size}",
+        "GET /users/{id}": lambda size: "/users/1",
+        "GET /users/auth/me": lambda size: "/users/auth/me",
+        "GET /users/auth/me/saved": lambda size: f"/users/auth/me/saved?limit={size}",
+        "GET /users/{id}/ratings": lambda size: f"/users/1/ratings?limit={size}",
+        "GET /places/": lambda size: f"/places/?limit={size}",
+        "GET /places/?search": lambda size: f"/places/?search=pantai&limit={size}",
+        "GET /places/nearby": lambda size: f"/places/nearby?lat=5.6&lon=95.1&radius_km=50&limit={size}",
+        "GET /places/{id}": lambda size: f"/places/{place_id}",
+        "GET /places/{id}/ratings": lambda size: f"/places/{place_id}/ratings?limit={size}",
+        "GET /places/{id}/ratings/summary": lambda size: f"/places/{place_id}/ratings/summary",
+    }
+
+    counter = QueryCounter(*{engine, read_engine, async_engine.sync_engine})
+    failures = 0
+    print(f"{'endpoint':<34} " + " ".join(f"{'n=' + str(size):>6}" for size in PAGE_SIZES) + f" {'expected':>9}")
+    for name, path in requests.items():
+        counts = []
+        for size in PAGE_SIZES:
+            counter.count = 0
+            response = client.get(path(size), headers=headers)
+            response.raise_for_status()
+            counts.append(counter.count)
+        ok = all(count == EXPECTED[name] for count in counts)
+        failures += not ok
+        print(f"{name:<34} " + " ".join(f"{count:>6}" for count in counts) + f" {EXPECTED[name]:>9}" + ("" if ok else "  FAIL"))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saved-per-user", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "check-secret")
+    # Cached responses would hide the queries being counted
+    os.environ["PLACE_CACHE_ENABLED"] = "false"
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-check-")
+    os.makedirs(os.path.join(workdir, "static"))
+    os.chdir(workdir)
+    sys.exit(main(args))
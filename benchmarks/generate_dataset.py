@@ -0,0 +1,253 @@
+"""Fills a new database with a large synthetic data set.
+
+Places are clustered around Pulo Aceh (Pulau Breueh, Pulau Nasi and the
+Banda Aceh coast). Ratings follow a Zipf-like popularity: a few places and
+a few very active users account for most of them. Scores are skewed towards
+4 and 5 stars, about a third of the ratings carry a message, and rating
+dates thin out going back three years. Users also save places, again
+preferring popular ones. Names and texts come from small Faker pools.
+
+Rows are written straight to SQLite with executemany in large batches.
+Per-row triggers and the ratings indexes are suspended during the load, and
+the search indexes and rating aggregates are then rebuilt set-based.
+
+    python benchmarks/generate_dataset.py big.db --places 100000 --users 1000000 --ratings 10000000
+    DATABASE_URL=sqlite:///./big.db fastapi dev app/main.py
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BATCH_SIZE = 100_000
+# (latitude, longitude, spread in degrees, share of places)
+CLUSTERS = (
+    (5.70, 95.06, 0.03, 0.45),  # Pulau Breueh
+    (5.62, 95.15, 0.025, 0.35),  # Pulau Nasi
+    (5.55, 95.30, 0.04, 0.20),  # Banda Aceh coast
+)
+PLACE_KINDS = ("Pantai", "Bukit", "Air Terjun", "Benteng", "Mercusuar", "Gua", "Teluk", "Pulau", "Danau", "Makam")
+GAMPONGS = ("Lampuyang", "Meulingge", "Gugop", "Rinon", "Alue Raya", "Lapeng", "Deudap", "Pasi Janeng", "Lamteng", "Ulee Paya")
+STAR_WEIGHTS = (5, 7, 15, 33, 40)
+MESSAGE_SHARE = 0.3
+RATING_HISTORY_SECONDS = 3 * 365 * 24 * 3600
+# Zipf exponents of place popularity and user activity
+PLACE_SKEW = 1.1
+USER_SKEW = 0.8
+
+def zipf_cum_weights(count: int, exponent: float):
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+def skewed_sampler(ids, exponent: float, rng: random.Random):
+    """Returns sample(k) drawing ids with Zipf-like weights; the popular ids are spread over the id range."""
+    ranked = list(ids)
+    rng.shuffle(ranked)
+    cum_weights = zipf_cum_weights(len(ranked), exponent)
+    return lambda k: rng.choices(ranked, cum_weights=cum_weights, k=k)
+
+def batched(rows, size: int = BATCH_SIZE):
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+class DatasetGenerator:
+    def __init__(self, conn, seed: int = 1, locale: str = "id_ID"):
+        from faker import Faker
+
+        self.conn = conn
+        self.rng = random.Random(seed)
+        fake = Faker(locale)
+        fake.seed_instance(seed)
+        self.names = [fake.name() for _ in range(5000)]
+        self.words = [fake.last_name() for _ in range(2000)]
+        self.paragraphs = [fake.paragraph(nb_sentences=4) for _ in range(1000)]
+        self.sentences = [fake.sentence(nb_words=8) for _ in range(2000)]
+
+    # ------------------ Helpers ------------------
+
+    def _suspend(self, kind: str, names):
+        """Drops triggers or indexes and returns their DDL to recreate them."""
+        ddl = []
+        for name in names:
+            row = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)).fetchone()
+            if row is not None:
+                ddl.append(row[0])
+                self.conn.execute(f"DROP {kind.upper()} {name}")
+        return ddl
+
+    def _restore(self, ddl):
+        for statement in ddl:
+            self.conn.execute(statement)
+
+    def _count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+    def _timed(self, label: str, table: str, fn):
+        started = time.perf_counter()
+        rows_before = self._count(table)
+        fn()
+        self.conn.commit()
+        count = self._count(table) - rows_before
+        seconds = time.perf_counter() - started
+        print(f"{label:<22} {count:>11,} rows {seconds:>8.1f} s {count / max(seconds, 1e-9):>12,.0f} rows/s")
+
+    # ------------------ Tables ------------------
+
+    def places(self, count: int):
+        rng = self.rng
+        cluster_weights = [cluster[3] for cluster in CLUSTERS]
+
+        def rows():
+            for _ in range(count):
+                lat, lon, spread, _ = rng.choices(CLUSTERS, weights=cluster_weights)[0]
+                yield (
+                    f"{rng.choice(PLACE_KINDS)} {rng.choice(self.words)}",
+                    rng.choice(self.paragraphs),
+                    rng.choice(GAMPONGS),
+                    round(rng.gauss(lat, spread), 6),
+                    round(rng.gauss(lon, spread), 6),
+                )
+
+        def load():
+            first_id = self.conn.execute("SELECT coalesce(max(id), 0) + 1 FROM places").fetchone()[0]
+            triggers = self._suspend("trigger", ["places_rtree_ai", "places_fts_ai"])
+            for batch in batched(rows()):
+                self.conn.executemany(
+                    "INSERT INTO places (name, description, location_name, latitude, longitude, average_rating) VALUES (?, ?, ?, ?, ?, 0)",
+                    batch,
+                )
+            self.conn.execute(
+                "INSERT INTO places_rtree SELECT id, latitude, latitude, longitude, longitude FROM places WHERE id >= ?", (first_id,)
+            )
+            self.conn.execute(
+                "INSERT INTO places_fts (rowid, name, description, location_name) "
+                "SELECT id, name, description, location_name FROM places WHERE id >= ?", (first_id,)
+            )
+            self._restore(triggers)
+
+        self._timed("places", "places", load)
+
+    def users(self, count: int, hashed_password: str):
+        rng = self.rng
+        first_id = self.conn.execute("SELECT coalesce(max(id), 0) + 1 FROM users").fetchone()[0]
+
+        def rows():
+            for number in range(first_id, first_id + count):
+                name = rng.choice(self.names)
+                handle = name.lower().replace(" ", ".").replace(",", "")
+                yield name, f"{handle}.{number}@example.com", hashed_password, number % 50 == 0, True
+
+        def load():
+            for batch in batched(rows()):
+                self.conn.executemany(
+                    "INSERT INTO users (name, email, hashed_password, is_admin, is_active) VALUES (?, ?, ?, ?, ?)", batch
+                )
+
+        self._timed("users", "users", load)
+
+    def ratings(self, count: int):
+        rng = self.rng
+        place_ids = [row[0] for row in self.conn.execute("SELECT id FROM places")]
+        user_ids = [row[0] for row in self.conn.execute("SELECT id FROM users")]
+        pick_places = skewed_sampler(place_ids, PLACE_SKEW, rng)
+        pick_users = skewed_sampler(user_ids, USER_SKEW, rng)
+        now = int(time.time())
+
+        def rows():
+            remaining = count
+            while remaining:
+                size = min(BATCH_SIZE, remaining)
+                remaining -= size
+                stars = rng.choices((1, 2, 3, 4, 5), weights=STAR_WEIGHTS, k=size)
+                for user_id, place_id, rating in zip(pick_users(size), pick_places(size), stars):
+                    message = rng.choice(self.sentences) if rng.random() < MESSAGE_SHARE else None
+                    # More recent dates are more likely
+                    created = now - int(RATING_HISTORY_SECONDS * rng.random() ** 2)
+                    yield user_id, place_id, rating, message, created
+
+        def load():
+            # Building the indexes once after the load beats updating them per row
+            indexes = self._suspend("index", [
+                name for (name,) in self.conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'ratings' AND sql IS NOT NULL"
+                ).fetchall()
+            ])
+            for batch in batched(rows()):
+                self.conn.executemany(
+                    "INSERT INTO ratings (user_id, place_id, rating, message, created_at) "
+                    "VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'))",
+                    batch,
+                )
+            self._restore(indexes)
+
+        self._timed("ratings", "ratings", load)
+
+    def saved_places(self, per_user: float):
+        rng = self.rng
+        place_ids = [row[0] for row in self.conn.execute("SELECT id FROM places")]
+        user_ids = [row[0] for row in self.conn.execute("SELECT id FROM users")]
+        pick_places = skewed_sampler(place_ids, PLACE_SKEW, rng)
+
+        def rows():
+            for user_id in user_ids:
+                # Geometric number of saved places with the given mean
+                saved = int(rng.expovariate(1 / per_user)) if per_user > 0 else 0
+                for place_id in set(pick_places(saved)):
+                    yield user_id, place_id
+
+        def load():
+            for batch in batched(rows()):
+                self.conn.executemany("INSERT OR IGNORE INTO user_place_association (user_id, place_id) VALUES (?, ?)", batch)
+
+        self._timed("saved places", "user_place_association", load)
+
+def generate(places: int, users: int, ratings: int, saved_per_user: float = 3.0, seed: int = 1):
+    """Generates the data set in the database of DATABASE_URL, which must have no places yet."""
+    from app.db import crud, migrations
+    from app.db.database import SessionLocal, engine, optimize
+    from app.db.utils import hash_password
+
+    migrations.upgrade(engine)
+    raw = engine.raw_connection()
+    conn = raw.driver_connection
+    try:
+        if conn.execute("SELECT count(*) FROM places").fetchone()[0]:
+            raise SystemExit("The database already has places; generate into a new file")
+        # Durability does not matter for a throwaway data set
+        conn.execute("PRAGMA synchronous = OFF")
+        generator = DatasetGenerator(conn, seed=seed)
+        generator.places(places)
+        # One bcrypt hash shared by every user, password "password"
+        generator.users(users, hash_password("password"))
+        generator.ratings(ratings)
+        generator.saved_places(saved_per_user)
+    finally:
+        raw.close()
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        crud.rebuild_rating_aggregates(db)
+    finally:
+        db.close()
+    optimize(engine)
+    print(f"{'aggregates + ANALYZE':<22} {'':>16} {time.perf_counter() - started:>8.1f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", help="SQLite file to create, e.g. big.db")
+    parser.add_argument("--places", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--ratings", type=int, default=10_000_000)
+    parser.add_argument("--saved-per-user", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    os.environ.setdefault("SECRET_KEY", "generate-secret")
+    sys.path.insert(0, ROOT)
+    generate(args.places, args.users, args.ratings, args.saved_per_user, args.seed)
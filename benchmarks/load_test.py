@@ -0,0 +1,348 @@
+"""Load test of the main user journeys against a real server.
+
+Seeds a throwaway SQLite database, boots uvicorn on it in a subprocess, and
+runs N virtual users for a fixed duration. Each user logs in once, then
+repeatedly picks a weighted scenario: browse the place list, open a place
+with the user's coordinates, log in again, rate a place, save and unsave a
+place, or upload a profile photo. Popular places get most of the traffic.
+
+Reports requests per second, latency percentiles and a latency histogram per
+route. --save-baseline stores the results as JSON. --baseline compares a run
+with stored results and exits non-zero when a route's p99 latency, throughput
+or error rate regressed by more than --tolerance. Baselines are only
+comparable on the same machine with the same options.
+
+    python benchmarks/load_test.py --concurrency 32 --duration 30 --save-baseline load_baseline.json
+    python benchmarks/load_test.py --concurrency 32 --duration 30 --baseline load_baseline.json
+    python benchmarks/load_test.py --weights browse=1 open_place=1 login=0
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "load-password"
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+# p99 changes smaller than this are noise, whatever the tolerance
+P99_SLACK_MS = 5.0
+
+# ------------------ Seeding ------------------
+
+def seed(places: int, users: int, ratings: int, rng: random.Random):
+    from sqlalchemy import insert
+
+    from app.db import crud, migrations, models, schemas
+    from app.db.database import SessionLocal, engine
+    from app.db.utils import hash_password
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    place_ids = crud.bulk_create_places(db, [
+        schemas.PlaceCreate(
+            name=f"Objek Wisata {number}",
+            description=f"Pantai dan bukit nomor {number} di Pulo Aceh",
+            location_name="Pulo Aceh",
+            latitude=round(5.6 + rng.uniform(-0.1, 0.1), 6),
+            longitude=round(95.1 + rng.uniform(-0.1, 0.1), 6),
+        )
+        for number in range(places)
+    ])
+    # One bcrypt hash shared by every user keeps seeding fast
+    hashed_password = hash_password(PASSWORD)
+    db.execute(insert(models.User), [
+        {"name": f"Load {number}", "email": f"load{number}@example.com", "hashed_password": hashed_password, "is_active": True}
+        for number in range(users)
+    ])
+    user_ids = db.scalars(models.User.__table__.select().with_only_columns(models.User.id)).all()
+    db.execute(insert(models.Rating), [
+        {"user_id": rng.choice(user_ids), "place_id": popular_place(rng, place_ids), "rating": rng.randint(1, 5), "message": "Bagus"}
+        for _ in range(ratings)
+    ])
+    db.commit()
+    crud.rebuild_rating_aggregates(db)
+    db.close()
+    return place_ids
+
+def popular_place(rng: random.Random, place_ids):
+    # Zipf-like skew: low indexes are picked far more often
+    return place_ids[min(int(rng.paretovariate(1.2)) - 1, len(place_ids) - 1)]
+
+def sample_photos(count: int):
+    from PIL import Image
+
+    photos = []
+    for number in range(count):
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 480), (number * 40 % 256, 120, 200)).save(buffer, "JPEG", quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+# ------------------ Server ------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workdir: str, workers: int, timeout: float = 60.0):
+    import httpx
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:create_app", "--factory",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        env=dict(os.environ, PYTHONPATH=ROOT), cwd=workdir,
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(f"{base_url}/places/?limit=1").status_code == 200:
+                return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within {timeout} s")
+
+# ------------------ Recording ------------------
+
+class Recorder:
+    """Collects requests started within the measured window [start, stop)."""
+
+    def __init__(self):
+        self.start = self.stop = float("inf")
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route: str, started: float, seconds: float, ok: bool):
+        if not self.start <= started < self.stop:
+            return
+        self.latencies.setdefault(route, []).append(seconds * 1000)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def results(self, duration: float) -> dict:
+        results = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples.sort()
+            results[route] = {
+                "count": len(samples),
+                "rps": len(samples) / duration,
+                "p50_ms": percentile(samples, 50),
+                "p90_ms": percentile(samples, 90),
+                "p99_ms": percentile(samples, 99),
+                "max_ms": samples[-1],
+                "error_rate": self.errors.get(route, 0) / len(samples),
+                "histogram": histogram(samples),
+            }
+        return results
+
+def percentile(sorted_samples, pct: float) -> float:
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def histogram(samples):
+    counts = [0] * len(BUCKETS_MS)
+    bucket = 0
+    for sample in samples:  # sorted
+        while sample > BUCKETS_MS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    return counts
+
+# ------------------ Scenarios ------------------
+
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, rng: random.Random, email: str, place_ids, photos):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.email = email
+        self.place_ids = place_ids
+        self.photos = photos
+        self.headers = {}
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.record(route, started, time.perf_counter() - started, ok)
+        return response
+
+    def place_id(self) -> int:
+        return popular_place(self.rng, self.place_ids)
+
+async def login(user: VirtualUser):
+    response = await user.request("POST /users/auth/login", "POST", "/users/auth/login", data={"username": user.email, "password": PASSWORD})
+    if response is not None and response.status_code == 200:
+        user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def browse(user: VirtualUser):
+    response = await user.request("GET /places/", "GET", "/places/?limit=20")
+    # Some visitors scroll to the second page
+    if response is not None and response.status_code == 200 and user.rng.random() < 0.3:
+        next_cursor = response.json().get("next_cursor")
+        if next_cursor:
+            await user.request("GET /places/", "GET", "/places/", params={"limit": 20, "cursor": next_cursor})
+
+async def open_place(user: VirtualUser):
+    params = {"user_lat": 5.55 + user.rng.uniform(0, 0.1), "user_lon": 95.3 + user.rng.uniform(0, 0.1)}
+    await user.request("GET /places/{id}", "GET", f"/places/{user.place_id()}", params=params)
+
+async def rate(user: VirtualUser):
+    body = {"rating": user.rng.randint(1, 5), "message": user.rng.choice([None, "Indah sekali", "Akses jalan rusak"])}
+    await user.request("POST /places/{id}/rate", "POST", f"/places/{user.place_id()}/rate", json=body, headers=user.headers)
+
+async def save_unsave(user: VirtualUser):
+    place_id = user.place_id()
+    await user.request("POST /users/save/{id}", "POST", f"/users/save/{place_id}", headers=user.headers)
+    await user.request("DELETE /users/unsave/{id}", "DELETE", f"/users/unsave/{place_id}", headers=user.headers)
+
+async def upload_photo(user: VirtualUser):
+    files = {"photo": ("photo.jpg", user.rng.choice(user.photos), "image/jpeg")}
+    await user.request("PUT /users/auth/me/photo", "PUT", "/users/auth/me/photo", files=files, headers=user.headers)
+
+# name: (default weight, scenario)
+SCENARIOS = {
+    "browse": (40, browse),
+    "open_place": (30, open_place),
+    "rate": (10, rate),
+    "save_unsave": (10, save_unsave),
+    "login": (5, login),
+    "upload_photo": (5, upload_photo),
+}
+
+async def run(base_url: str, args, place_ids, recorder: Recorder):
+    import httpx
+
+    weights = dict((name, weight) for name, (weight, _) in SCENARIOS.items())
+    weights.update(args.weights)
+    names = [name for name in SCENARIOS if weights[name] > 0]
+    photos = sample_photos(4)
+
+    async def virtual_user(number: int):
+        rng = random.Random(args.seed + number)
+        user = VirtualUser(client, recorder, rng, f"load{number % args.users}@example.com", place_ids, photos)
+        await login(user)
+        while time.perf_counter() < recorder.stop:
+            name = rng.choices(names, weights=[weights[name] for name in names])[0]
+            await SCENARIOS[name][1](user)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        tasks = [asyncio.create_task(virtual_user(number)) for number in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        recorder.start = time.perf_counter()
+        recorder.stop = recorder.start + args.duration
+        # Requests still running at the end are waited for but not counted
+        await asyncio.gather(*tasks)
+
+# ------------------ Report ------------------
+
+def print_report(results: dict, duration: float):
+    total = sum(route["count"] for route in results.values())
+    print(f"{total} requests in {duration:.1f} s: {total / duration:.1f} req/s")
+    print()
+    print(f"{'route':<28} {'count':>7} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for name, route in results.items():
+        print(
+            f"{name:<28} {route['count']:>7} {route['rps']:>8.1f} {route['p50_ms']:>8.1f} {route['p90_ms']:>8.1f} "
+            f"{route['p99_ms']:>8.1f} {route['max_ms']:>8.1f} {route['error_rate']:>7.1%}"
+        )
+    print()
+    labels = [f"<={bound:g}" if bound != float("inf") else f">{BUCKETS_MS[-2]:g}" for bound in BUCKETS_MS]
+    print(f"{'latency histogram (ms)':<28} " + " ".join(f"{label:>6}" for label in labels))
+    for name, route in results.items():
+        print(f"{name:<28} " + " ".join(f"{count:>6}" for count in route["histogram"]))
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    print()
+    print(f"{'route':<28} {'p99 ms':>17} {'rps':>17} {'errors':>15}")
+    regressions = 0
+    for name, base in baseline["routes"].items():
+        route = results.get(name)
+        if route is None:
+            print(f"{name:<28} missing from this run  REGRESSION")
+            regressions += 1
+            continue
+        slower = route["p99_ms"] > base["p99_ms"] * (1 + tolerance) and route["p99_ms"] - base["p99_ms"] > P99_SLACK_MS
+        fewer = route["rps"] < base["rps"] * (1 - tolerance)
+        failing = route["error_rate"] > base["error_rate"] + 0.01
+        regressed = slower or fewer or failing
+        regressions += regressed
+        print(
+            f"{name:<28} {base['p99_ms']:>7.1f} -> {route['p99_ms']:>7.1f} {base['rps']:>7.1f} -> {route['rps']:>7.1f} "
+            f"{base['error_rate']:>6.1%} -> {route['error_rate']:>5.1%}" + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+def parse_weight(value: str):
+    name, _, weight = value.partition("=")
+    if name not in SCENARIOS or not weight.isdigit():
+        raise argparse.ArgumentTypeError(f"expected <scenario>=<weight> with a scenario in: {', '.join(SCENARIOS)}")
+    return name, int(weight)
+
+def main(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="pulo-aceh-load-")
+    os.makedirs(os.path.join(workdir, "static"))
+    os.chdir(workdir)
+    place_ids = seed(args.places, args.users, args.ratings, random.Random(args.seed))
+
+    server, base_url = start_server(workdir, args.workers)
+    try:
+        recorder = Recorder()
+        asyncio.run(run(base_url, args, place_ids, recorder))
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = recorder.results(args.duration)
+    print_report(results, args.duration)
+    if args.save_baseline:
+        options = {name: getattr(args, name) for name in ("concurrency", "duration", "workers", "places", "users", "ratings")}
+        with open(args.save_baseline, "w") as f:
+            json.dump({"options": options, "routes": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{regressions} route(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before the measurement")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--places", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--ratings", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--weights", nargs="*", type=parse_weight, default=[], metavar="SCENARIO=WEIGHT")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, help="Write this run's results as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "load-secret")
+    sys.path.insert(0, ROOT)
+    args.save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+    sys.exit(main(args))